@@ -1,6 +1,9 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, MetaData, Table, Column, String, select, delete, insert, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.exc import OperationalError
+import asyncio
+import hashlib
 import os
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./user_hub.db")
@@ -13,25 +16,91 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
-# Retry logic for DB connection
-import time
-from sqlalchemy.exc import OperationalError
+# Fingerprint of the last schema created by init_schema().
+# Lives outside Base.metadata so it never changes the fingerprint itself.
+schema_version_table = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", String, primary_key=True),
+)
+
+# Readiness reported by the /health endpoint
+db_state = {
+    "ready": False,
+    "schema_version": None,
+    "schema_created": False,
+    "error": None,
+}
+
+def schema_fingerprint(metadata) -> str:
+    """Hash of every table/column definition, changes whenever a model changes."""
+    digest = hashlib.sha256()
+    for table in sorted(metadata.tables.values(), key=lambda t: t.name):
+        digest.update(table.name.encode())
+        for column in table.columns:
+            digest.update(f"{column.name}:{column.type}:{column.nullable}:{column.primary_key}".encode())
+    return digest.hexdigest()[:16]
+
+def _ping():
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
 
-def wait_for_db():
-    retries = 30
-    while retries > 0:
+def _stored_schema_version():
+    with engine.connect() as connection:
+        if not engine.dialect.has_table(connection, schema_version_table.name):
+            return None
+        return connection.execute(select(schema_version_table.c.version)).scalar()
+
+def init_schema(metadata) -> bool:
+    """
+    Create missing tables unless the stored fingerprint already matches.
+    Returns True when create_all actually ran.
+    """
+    version = schema_fingerprint(metadata)
+    db_state["schema_version"] = version
+    if _stored_schema_version() == version:
+        return False
+
+    metadata.create_all(bind=engine)
+    schema_version_table.create(bind=engine, checkfirst=True)
+    with engine.begin() as connection:
+        connection.execute(delete(schema_version_table))
+        connection.execute(insert(schema_version_table).values(version=version))
+    return True
+
+async def wait_for_db(timeout: float = 60.0, initial_delay: float = 0.25, max_delay: float = 5.0) -> bool:
+    """Retry connecting with exponential backoff, without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    delay = initial_delay
+    while True:
         try:
-            # Try to connect
-            with engine.connect() as connection:
-                print("Database connected!")
-                return
-        except OperationalError:
-            print(f"Database not ready, retrying in 2 seconds... ({retries} left)")
-            time.sleep(2)
-            retries -= 1
-    print("Could not connect to database after retries.")
-
-wait_for_db()
+            await loop.run_in_executor(None, _ping)
+            print("Database connected!")
+            return True
+        except OperationalError as e:
+            db_state["error"] = str(e)
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                print("Could not connect to database after retries.")
+                return False
+            delay = min(delay, max_delay, remaining)
+            print(f"Database not ready, retrying in {delay:.2f} seconds...")
+            await asyncio.sleep(delay)
+            delay *= 2
+
+async def prepare_database(metadata, timeout: float = 60.0):
+    """Lifespan task: wait for the database, then make sure the schema exists."""
+    loop = asyncio.get_running_loop()
+    try:
+        if not await wait_for_db(timeout=timeout):
+            return
+        db_state["schema_created"] = await loop.run_in_executor(None, init_schema, metadata)
+        db_state["ready"] = True
+        db_state["error"] = None
+    except Exception as e:
+        db_state["error"] = str(e)
+        print(f"Schema initialization failed: {e}")
 
 def get_db():
     db = SessionLocal()
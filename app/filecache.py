@@ -0,0 +1,188 @@
+"""
+On-disk LRU caches of generated files (converter results, YouTube downloads).
+
+Entries are files in one directory, named after their key, evicted least
+recently used first once their total size exceeds the bound. Files being
+sent to a client hold a reference (acquire()/release()) and are never
+evicted mid-transfer. Names starting with "." are work in progress
+(".pending-..."): they are not indexed, and sweep() removes the ones left
+alone for longer than the age limit.
+
+Caches are used from worker threads and the retention sweep as well as the
+event loop, so every operation takes the cache's lock.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+PENDING_PREFIX = ".pending-"
+
+
+class FileCache:
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (path, size), least recently used first
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._refs = {}  # key -> number of transfers in progress
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        """Rebuild the index from disk, oldest access first."""
+        found = []
+        for name in os.listdir(self.root):
+            if name.startswith("."):
+                continue
+            path = os.path.join(self.root, name)
+            stat = os.stat(path)
+            found.append((stat.st_atime, os.path.splitext(name)[0], path, stat.st_size))
+        for _, key, path, size in sorted(found):
+            self.entries[key] = (path, size)
+            self.total_bytes += size
+        self._evict()
+
+    def temp_path(self, suffix: str = "") -> str:
+        """Path for an entry being written (hidden from the index until put)."""
+        return os.path.join(self.root, f"{PENDING_PREFIX}{uuid.uuid4()}{suffix}")
+
+    def _lookup(self, key: str) -> Optional[str]:
+        entry = self.entries.get(key)
+        if entry and os.path.exists(entry[0]):
+            self.entries.move_to_end(key)
+            os.utime(entry[0])
+            return entry[0]
+        if entry:
+            # File vanished behind our back
+            self._drop(key)
+        return None
+
+    def __contains__(self, key: str) -> bool:
+        """Whether `key` is cached (no hit/miss counted, recency unchanged)."""
+        with self._lock:
+            entry = self.entries.get(key)
+            return entry is not None and os.path.exists(entry[0])
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            path = self._lookup(key)
+            if path:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return path
+
+    def acquire(self, key: str) -> Optional[str]:
+        """Cached path for `key`, protected from eviction until release()."""
+        with self._lock:
+            path = self._lookup(key)
+            if path:
+                self._refs[key] = self._refs.get(key, 0) + 1
+            return path
+
+    def release(self, key: str):
+        with self._lock:
+            count = self._refs.get(key, 0) - 1
+            if count > 0:
+                self._refs[key] = count
+            else:
+                self._refs.pop(key, None)
+            # Entries skipped while in use can go now
+            self._evict()
+
+    def _put(self, key: str, src_path: str, path: str) -> str:
+        """Move a finished file to `path` in the cache and index it under `key`."""
+        with self._lock:
+            os.replace(src_path, path)
+            if key in self.entries:
+                old_path, _ = self._drop(key)
+                if old_path != path:
+                    self._remove(old_path)
+            size = os.path.getsize(path)
+            self.entries[key] = (path, size)
+            self.total_bytes += size
+            self._evict(keep=key)
+        return path
+
+    def _drop(self, key: str):
+        path, size = self.entries.pop(key)
+        self.total_bytes -= size
+        return path, size
+
+    def _evict(self, keep: str = None, limit: Optional[int] = None):
+        limit = self.max_bytes if limit is None else min(limit, self.max_bytes)
+        for key in list(self.entries):
+            if self.total_bytes <= limit:
+                break
+            if key == keep or key in self._refs:
+                continue
+            path, _ = self._drop(key)
+            self._remove(path)
+
+    def sweep(self, max_age: Optional[float] = None, max_bytes: Optional[int] = None):
+        """
+        Retention hook: drop entries unused for `max_age` seconds and
+        pending files nobody wrote to for that long, then evict down to
+        `max_bytes`. Returns (files, bytes) removed.
+        """
+        now = time.time()
+        removed_files, removed_bytes = 0, 0
+        with self._lock:
+            if max_age is not None:
+                for key, (path, size) in list(self.entries.items()):
+                    if key in self._refs:
+                        continue
+                    try:
+                        # Every hit refreshes the mtime (see _lookup)
+                        expired = now - os.stat(path).st_mtime > max_age
+                    except FileNotFoundError:
+                        self._drop(key)
+                        continue
+                    if expired:
+                        self._drop(key)
+                        self._remove(path)
+                        removed_files += 1
+                        removed_bytes += size
+            files, total = len(self.entries), self.total_bytes
+            self._evict(limit=max_bytes)
+            removed_files += files - len(self.entries)
+            removed_bytes += total - self.total_bytes
+
+        if max_age is not None:
+            with os.scandir(self.root) as it:
+                for entry in it:
+                    if not entry.name.startswith(PENDING_PREFIX):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    # Pending files keep changing while they are written
+                    if now - stat.st_mtime > max_age:
+                        self._remove(entry.path)
+                        removed_files += 1
+                        removed_bytes += stat.st_size
+        return removed_files, removed_bytes
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "total_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "in_use": len(self._refs),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
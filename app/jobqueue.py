@@ -0,0 +1,130 @@
+"""
+Background jobs shared by the tools (conversions, YouTube downloads).
+
+A job is a dataclass whose state changes go through update(), which wakes
+everything waiting on it (a request holding the connection, an SSE stream).
+A JobQueue keeps one tool's jobs, caps how many are queued or running (the
+queue depth; QueueFull beyond it) and forgets finished jobs after JOB_TTL.
+
+Jobs producing a cacheable file carry a cache key. A request for a key that
+is already being produced gets a job of its own that follows the running
+one: it mirrors every update, keeps its own request details (e.g. the
+download name) and takes no queue slot.
+"""
+import asyncio
+import dataclasses
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional
+
+# Finished jobs are forgotten after this many seconds (their files live in the cache)
+JOB_TTL = 3600
+
+
+class QueueFull(Exception):
+    pass
+
+
+@dataclass(kw_only=True)
+class BaseJob:
+    id: str
+    cache_key: Optional[str] = None
+    status: str = "queued"  # queued, running, done, failed
+    progress: float = 0.0
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    # Set when this request joined an identical job already running
+    follows: Optional[str] = None
+    followers: list = field(default_factory=list, repr=False)
+    changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def update(self, **changes):
+        for key, value in changes.items():
+            setattr(self, key, value)
+        # Wake up everyone waiting on this job, then re-arm for the next change
+        self.changed.set()
+        self.changed = asyncio.Event()
+        for follower in self.followers:
+            follower.update(**changes)
+
+
+class JobQueue:
+    full_message = "Queue is full, try again later"
+
+    def __init__(self, queue_depth: int, cache=None):
+        self.queue_depth = queue_depth
+        # FileCache of finished outputs, or None
+        self.cache = cache
+        self.jobs = {}
+        self._in_flight = {}  # cache key -> unfinished job
+        self._tasks = set()
+
+    def pending(self) -> int:
+        # Joined requests do no work of their own
+        return sum(1 for job in self.jobs.values() if not job.finished and job.follows is None)
+
+    def check_queue(self, count: int = 1):
+        """Raise QueueFull unless `count` more jobs fit in the queue."""
+        if self.pending() + count > self.queue_depth:
+            raise QueueFull(self.full_message)
+
+    def _count_new(self, keys) -> int:
+        """Jobs these cache keys would start: cached, in-flight and repeated keys start none."""
+        return sum(1 for key in set(keys) if key not in self._in_flight and (self.cache is None or key not in self.cache))
+
+    def _forget_expired(self):
+        cutoff = time.time() - JOB_TTL
+        for job_id in [j.id for j in self.jobs.values() if j.finished and j.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+    def _add(self, job: BaseJob) -> BaseJob:
+        self.jobs[job.id] = job
+        return job
+
+    def _start(self, job: BaseJob, work):
+        """Run the coroutine `work` for `job`; identical requests join it until it ends."""
+        self._add(job)
+        if job.cache_key:
+            self._in_flight[job.cache_key] = job
+        task = asyncio.create_task(self._track(job, work))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _track(self, job: BaseJob, work):
+        try:
+            await work
+        finally:
+            self._in_flight.pop(job.cache_key, None)
+
+    def _join(self, key: Optional[str], **own) -> Optional[BaseJob]:
+        """Job following the one in flight for `key` (None if there is none), with its own `own` fields."""
+        leader = self._in_flight.get(key) if key else None
+        if leader is None:
+            return None
+        job = dataclasses.replace(leader, id=str(uuid.uuid4()), created_at=time.time(), follows=leader.id,
+                                  followers=[], changed=asyncio.Event(), **own)
+        leader.followers.append(job)
+        return self._add(job)
+
+    def get(self, job_id: str) -> Optional[BaseJob]:
+        return self.jobs.get(job_id)
+
+    async def wait(self, job: BaseJob, timeout: Optional[float] = None) -> BaseJob:
+        """Wait until the job changes state; returns immediately if it is finished."""
+        if not job.finished:
+            try:
+                await asyncio.wait_for(job.changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return job
+
+    async def result(self, job: BaseJob) -> BaseJob:
+        while not job.finished:
+            await self.wait(job)
+        return job
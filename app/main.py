@@ -1,34 +1,92 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from .database import engine, Base
+from .database import Base, db_state, prepare_database
 from . import models
 from .routers import auth, dashboard
+from .tools import registry
+from .retention import retention, MB
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+DB_READY_TIMEOUT = float(os.getenv("DB_READY_TIMEOUT", "60"))
 
-app = FastAPI()
+# Tools are imported on first use (or warmed in the background once the server is up)
+LAZY_TOOLS = os.getenv("LAZY_TOOLS", "1") == "1"
+WARM_TOOLS = os.getenv("WARM_TOOLS", "1") == "1"
 
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
-templates = Jinja2Templates(directory="app/templates")
+# Converter inputs/outputs and YouTube downloads are evicted by age and quota
+retention.watch(
+    "uploads",
+    "app/static/uploads",
+    max_bytes=int(os.getenv("UPLOADS_QUOTA_MB", "2048")) * MB,
+    max_age=float(os.getenv("UPLOADS_MAX_AGE_HOURS", "24")) * 3600,
+)
+retention.watch(
+    "downloads",
+    "app/static/downloads",
+    max_bytes=int(os.getenv("DOWNLOADS_QUOTA_MB", "4096")) * MB,
+    max_age=float(os.getenv("DOWNLOADS_MAX_AGE_HOURS", "6")) * 3600,
+)
 
-# Include routers (to be created)
-app.include_router(auth.router)
-app.include_router(dashboard.router)
+registry.register("notes", "app.tools.notes_tool.router", "/tools/notes", "Sticky notes, docs and todo lists")
+registry.register("converter", "app.tools.converter_tool.router", "/tools/converter", "Image, document and media conversion",
+                  shutdown="shutdown")
+registry.register("lol", "app.tools.lol_tool.router", "/tools/lol", "League of Legends champion builds",
+                  background="run_prefetcher", shutdown="shutdown")
+registry.register("youtube", "app.tools.youtube_tool.router", "/tools/youtube", "YouTube video and audio downloads")
 
-from .tools.notes_tool import router as notes_router
-app.include_router(notes_router.router)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Database readiness and schema creation run in the background so static
+    # and template routes are served while the database comes up.
+    tasks = [
+        asyncio.create_task(prepare_database(Base.metadata, timeout=DB_READY_TIMEOUT)),
+        asyncio.create_task(retention.run()),
+    ]
+    # Background work of tools (e.g. the LoL build prefetcher) starts as they load
+    registry.start()
+    if LAZY_TOOLS and WARM_TOOLS:
+        tasks.append(asyncio.create_task(registry.warm()))
+    yield
+    # Cancels tool background tasks, then shuts down their pools and clients
+    await registry.stop()
+    for task in tasks:
+        if not task.done():
+            task.cancel()
 
-from .tools.converter_tool import router as converter_router
-app.include_router(converter_router.router)
+app = FastAPI(lifespan=lifespan)
 
-from .tools.lol_tool import router as lol_router
-app.include_router(lol_router.router)
+app.mount("/static", StaticFiles(directory="app/static"), name="static")
+templates = Jinja2Templates(directory="app/templates")
 
-from .tools.youtube_tool import router as youtube_router
-app.include_router(youtube_router.router)
+app.include_router(auth.router)
+app.include_router(dashboard.router)
+registry.mount(app, lazy=LAZY_TOOLS)
 
 @app.get("/")
 async def root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
+
+@app.get("/health")
+async def health():
+    status_code = 200 if db_state["ready"] else 503
+    return JSONResponse(
+        status_code=status_code,
+        content={
+            "status": "ok" if db_state["ready"] else "starting",
+            "database": db_state,
+            "tools": {name: info["loaded"] for name, info in registry.status().items()},
+        },
+    )
+
+@app.get("/health/storage")
+async def storage_stats():
+    return retention.stats()
+
+@app.get("/tools")
+async def list_tools():
+    return registry.status()
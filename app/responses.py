@@ -0,0 +1,61 @@
+"""
+Responses shared by the tools.
+"""
+import json
+from typing import Callable
+
+from fastapi.responses import FileResponse, StreamingResponse
+
+# Seconds between two events while a job is unchanged (keeps proxies from closing the stream)
+KEEPALIVE_SECONDS = 15
+
+
+class _ReleaseWhenSent:
+    """
+    `release` runs once sending has ended, whether it finished, failed or
+    the client went away, so what the response holds is never left taken
+    (a background task would be skipped on disconnect).
+    """
+
+    release: Callable[[], None]
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
+
+
+class ReleasingFileResponse(_ReleaseWhenSent, FileResponse):
+    """FileResponse for a cache entry held with acquire()."""
+
+    def __init__(self, path: str, release: Callable[[], None], **kwargs):
+        super().__init__(path, **kwargs)
+        self.release = release
+
+
+class ReleasingStreamingResponse(_ReleaseWhenSent, StreamingResponse):
+    """StreamingResponse holding a slot (e.g. a queue slot) while the body is sent."""
+
+    def __init__(self, content, release: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self.release = release
+
+
+class JobEventsResponse(StreamingResponse):
+    """
+    Server-Sent Events stream of a job's state (its to_dict()) on every
+    change until it finishes, for a job of `queue` (see app/jobqueue.py).
+    """
+
+    def __init__(self, job, queue, **kwargs):
+        super().__init__(self._events(job, queue), media_type="text/event-stream", **kwargs)
+
+    @staticmethod
+    async def _events(job, queue):
+        while True:
+            yield f"data: {json.dumps(job.to_dict())}\n\n"
+            if job.finished:
+                break
+            # Wait for the next change, with a periodic keep-alive
+            await queue.wait(job, timeout=KEEPALIVE_SECONDS)
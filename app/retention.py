@@ -0,0 +1,192 @@
+"""
+Disk retention for generated files (converter uploads, YouTube downloads).
+
+A background task sweeps every watched directory: files older than the
+directory's max age are removed, then least recently used files are evicted
+until the directory is back under its byte quota. Files that are pinned
+(in use by a running job) or were written very recently are never touched.
+
+Only the top level of a directory is scanned. A cache that keeps its own
+index in a subdirectory (converter results, YouTube downloads; see
+app/filecache.py) is attached to the policy instead. Each sweep asks it to
+apply the same age limit and whatever quota the loose files leave, through
+its own eviction, so entries being sent are skipped and its index stays
+consistent.
+"""
+import asyncio
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+MB = 1024 * 1024
+
+# Files younger than this are assumed to still be written
+GRACE_SECONDS = 60
+
+IGNORED_FILES = {".gitkeep"}
+
+
+@dataclass
+class RetentionPolicy:
+    directory: str
+    max_bytes: int
+    max_age: Optional[float] = None  # seconds
+    # Counters kept across sweeps
+    files: int = 0
+    bytes: int = 0
+    evicted_files: int = 0
+    evicted_bytes: int = 0
+    last_sweep: Optional[float] = None
+    errors: list = field(default_factory=list)
+    # Caches sharing this policy's age limit and quota (see RetentionService.attach)
+    caches: list = field(default_factory=list)
+
+    def to_dict(self):
+        return {
+            "directory": self.directory,
+            "files": self.files,
+            "bytes": self.bytes,
+            "quota_bytes": self.max_bytes,
+            "max_age_seconds": self.max_age,
+            "evicted_files": self.evicted_files,
+            "evicted_bytes": self.evicted_bytes,
+            "last_sweep": self.last_sweep,
+            "errors": self.errors[-5:],
+        }
+
+
+class RetentionService:
+    def __init__(self, interval: float = 60.0):
+        self.interval = interval
+        self.policies = {}
+        self._access = {}  # path -> last access time reported by the app
+        self._pins = {}  # path -> reference count
+        self._lock = threading.Lock()
+
+    def watch(self, name: str, directory: str, max_bytes: int, max_age: Optional[float] = None):
+        os.makedirs(directory, exist_ok=True)
+        self.policies[name] = RetentionPolicy(directory, max_bytes, max_age)
+
+    def attach(self, name: str, cache):
+        """
+        Put a self-managed cache under the `name` policy. The cache must
+        provide sweep(max_age, max_bytes) -> (evicted files, evicted bytes)
+        and report its size as `entries` and `total_bytes`.
+        """
+        self.policies[name].caches.append(cache)
+
+    def touch(self, path: str):
+        """Record an access (atime is unreliable on relatime/noatime mounts)."""
+        with self._lock:
+            self._access[os.path.abspath(path)] = time.time()
+
+    def pin(self, path: str):
+        with self._lock:
+            path = os.path.abspath(path)
+            self._pins[path] = self._pins.get(path, 0) + 1
+
+    def unpin(self, path: str):
+        with self._lock:
+            path = os.path.abspath(path)
+            count = self._pins.get(path, 0) - 1
+            if count > 0:
+                self._pins[path] = count
+            else:
+                self._pins.pop(path, None)
+
+    def _scan(self, policy: RetentionPolicy, seen: set):
+        entries = []
+        with os.scandir(policy.directory) as it:
+            for entry in it:
+                if entry.name in IGNORED_FILES or not entry.is_file(follow_symlinks=False):
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                path = os.path.abspath(entry.path)
+                seen.add(path)
+                with self._lock:
+                    last_access = max(stat.st_mtime, stat.st_atime, self._access.get(path, 0))
+                entries.append([last_access, stat.st_mtime, stat.st_size, path])
+        return entries
+
+    def _evictable(self, path: str, mtime: float, now: float) -> bool:
+        with self._lock:
+            pinned = path in self._pins
+        return not pinned and now - mtime >= GRACE_SECONDS
+
+    def _remove(self, policy: RetentionPolicy, path: str, size: int) -> bool:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            policy.errors.append(f"{path}: {e}")
+            return False
+        with self._lock:
+            self._access.pop(path, None)
+        policy.evicted_files += 1
+        policy.evicted_bytes += size
+        return True
+
+    def sweep_policy(self, policy: RetentionPolicy, seen: Optional[set] = None):
+        now = time.time()
+        entries = self._scan(policy, seen if seen is not None else set())
+        kept = []
+        for last_access, mtime, size, path in entries:
+            expired = policy.max_age is not None and now - last_access > policy.max_age
+            if expired and self._evictable(path, mtime, now) and self._remove(policy, path, size):
+                continue
+            kept.append((last_access, mtime, size, path))
+
+        total = sum(size for _, _, size, _ in kept)
+        if total > policy.max_bytes:
+            # Least recently used first
+            kept.sort()
+            remaining = []
+            for last_access, mtime, size, path in kept:
+                if total > policy.max_bytes and self._evictable(path, mtime, now) and self._remove(policy, path, size):
+                    total -= size
+                else:
+                    remaining.append((last_access, mtime, size, path))
+            kept = remaining
+
+        files = len(kept)
+        for cache in policy.caches:
+            evicted_files, evicted_bytes = cache.sweep(max_age=policy.max_age, max_bytes=max(policy.max_bytes - total, 0))
+            policy.evicted_files += evicted_files
+            policy.evicted_bytes += evicted_bytes
+            files += len(cache.entries)
+            total += cache.total_bytes
+
+        policy.files = files
+        policy.bytes = total
+        policy.last_sweep = now
+
+    def sweep(self):
+        started = time.time()
+        seen = set()
+        for policy in self.policies.values():
+            try:
+                self.sweep_policy(policy, seen)
+            except OSError as e:
+                policy.errors.append(str(e))
+        self._forget_missing(seen, started)
+
+    def _forget_missing(self, seen: set, started: float):
+        """Drop access times of files no sweep saw (deleted) unless they were touched since it began."""
+        with self._lock:
+            for path in [p for p, at in self._access.items() if p not in seen and at < started]:
+                del self._access[path]
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await loop.run_in_executor(None, self.sweep)
+            await asyncio.sleep(self.interval)
+
+    def stats(self):
+        return {name: policy.to_dict() for name, policy in self.policies.items()}
+
+
+retention = RetentionService(interval=float(os.getenv("RETENTION_INTERVAL", "60")))
@@ -1,10 +1,150 @@
-from fastapi import APIRouter
+import asyncio
+import importlib
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import APIRouter, FastAPI, Request
+
+
+@dataclass
+class ToolSpec:
+    name: str
+    module: str  # dotted path of the module exposing `router`
+    route_prefix: str  # e.g. "/tools/notes"
+    description: str = ""
+    # Name of a coroutine function in the module to run while the app is up
+    background: Optional[str] = None
+    # Name of a function (or coroutine function) in the module that releases
+    # its resources (process pools, HTTP clients) at shutdown
+    shutdown: Optional[str] = None
+
 
 class ToolRegistry:
+    """
+    Declares the tools and mounts their routers on first use.
+
+    Tool modules can be expensive to import (yt-dlp, BeautifulSoup, the
+    converter's job engine), so nothing is imported until a request hits the
+    tool's prefix or `warm()` loads it in the background. A tool's background
+    task starts once it is loaded (if the app is running); at shutdown `stop()`
+    cancels it and then runs the shutdown hook of every loaded tool.
+    """
+
     def __init__(self):
         self.tools = {}
+        self.routers = {}
+        self.app = None
+        self._lock = threading.Lock()
+        self._loop = None
+        self._tasks = {}  # tool name -> background task
+
+    def register(self, tool_name: str, module: str, route_prefix: str, description: str = "",
+                 background: Optional[str] = None, shutdown: Optional[str] = None):
+        self.tools[tool_name] = ToolSpec(tool_name, module, route_prefix, description, background, shutdown)
+
+    def is_loaded(self, tool_name: str) -> bool:
+        return tool_name in self.routers
+
+    def match(self, path: str):
+        """Return the name of the tool owning `path`, if any."""
+        for spec in self.tools.values():
+            prefix = spec.route_prefix.rstrip("/")
+            if path == prefix or path.startswith(prefix + "/"):
+                return spec.name
+        return None
+
+    def load(self, tool_name: str) -> APIRouter:
+        """Import the tool module and include its router (blocking, idempotent)."""
+        with self._lock:
+            if tool_name in self.routers:
+                return self.routers[tool_name]
+            spec = self.tools[tool_name]
+            router = importlib.import_module(spec.module).router
+            if self.app is not None:
+                self.app.include_router(router)
+                # Routes changed, regenerate the schema on next request
+                self.app.openapi_schema = None
+            self.routers[tool_name] = router
+            if self._loop is not None:
+                # Usually called from an executor thread
+                self._loop.call_soon_threadsafe(self._start_background, tool_name)
+            return router
+
+    def _start_background(self, tool_name: str):
+        spec = self.tools[tool_name]
+        if spec.background is None or tool_name in self._tasks or self._loop is None:
+            return
+        run = getattr(importlib.import_module(spec.module), spec.background)
+        self._tasks[tool_name] = self._loop.create_task(run())
+
+    def start(self):
+        """Called from the app lifespan: run the background tasks of loaded tools (and of tools loaded later)."""
+        self._loop = asyncio.get_running_loop()
+        for tool_name in list(self.routers):
+            self._start_background(tool_name)
+
+    async def stop(self):
+        self._loop = None
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for tool_name in list(self.routers):
+            spec = self.tools[tool_name]
+            if spec.shutdown is None:
+                continue
+            try:
+                result = getattr(importlib.import_module(spec.module), spec.shutdown)()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                print(f"Failed to shut down tool '{tool_name}': {e}")
+
+    def load_all(self):
+        for tool_name in self.tools:
+            self.load(tool_name)
+
+    async def ensure_loaded(self, tool_name: str):
+        if not self.is_loaded(tool_name):
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.load, tool_name)
+
+    async def warm(self):
+        """Load every pending tool one by one without blocking the event loop."""
+        for tool_name in list(self.tools):
+            try:
+                await self.ensure_loaded(tool_name)
+            except Exception as e:
+                print(f"Failed to warm tool '{tool_name}': {e}")
+
+    def mount(self, app: FastAPI, lazy: bool = True):
+        """Attach to `app`; with `lazy=False` every tool is imported right away."""
+        self.app = app
+        for router in self.routers.values():
+            app.include_router(router)
+
+        if not lazy:
+            self.load_all()
+            return
+
+        @app.middleware("http")
+        async def load_tool_on_demand(request: Request, call_next):
+            tool_name = self.match(request.url.path)
+            if tool_name:
+                await self.ensure_loaded(tool_name)
+            return await call_next(request)
+
+    def status(self):
+        return {
+            name: {
+                "route_prefix": spec.route_prefix,
+                "description": spec.description,
+                "loaded": self.is_loaded(name),
+            }
+            for name, spec in self.tools.items()
+        }
 
-    def register(self, tool_name: str, router: APIRouter):
-        self.tools[tool_name] = router
 
 registry = ToolRegistry()
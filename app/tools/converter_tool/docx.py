@@ -0,0 +1,70 @@
+"""
+DOCX -> PDF through mammoth (DOCX -> HTML) and WeasyPrint (HTML -> PDF).
+
+Pool workers are long-lived, so the expensive WeasyPrint state (font
+configuration, parsed stylesheet) is built once per worker and reused by
+every conversion it runs. Embedded images are written to a temporary
+directory and referenced by URL instead of being inlined by mammoth as
+base64 data URIs, which kept several copies of every image in memory.
+"""
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+STYLESHEET = """
+@page { size: A4; margin: 2cm; }
+img { max-width: 100%; }
+table { border-collapse: collapse; }
+"""
+
+_renderer = None
+
+
+def renderer():
+    """(FontConfiguration, stylesheet) shared by every conversion in this process."""
+    global _renderer
+    if _renderer is None:
+        from weasyprint import CSS
+        from weasyprint.text.fonts import FontConfiguration
+        font_config = FontConfiguration()
+        _renderer = (font_config, CSS(string=STYLESHEET, font_config=font_config))
+    return _renderer
+
+
+def warm():
+    """Import the libraries and build the renderer ahead of the first conversion."""
+    import mammoth  # noqa: F401
+    renderer()
+
+
+def _image_writer(directory: str):
+    """mammoth image converter saving each image to `directory`."""
+    import mammoth
+    count = 0
+
+    def write_image(image):
+        nonlocal count
+        count += 1
+        ext = (image.content_type or "").partition("/")[2] or "bin"
+        name = f"image{count}.{ext}"
+        with image.open() as src, open(os.path.join(directory, name), "wb") as dest:
+            shutil.copyfileobj(src, dest)
+        return {"src": name}
+
+    return mammoth.images.img_element(write_image)
+
+
+def convert_docx_to_pdf(input_path, output_path):
+    import mammoth
+    from weasyprint import HTML
+    font_config, stylesheet = renderer()
+    with tempfile.TemporaryDirectory(prefix="docx-") as assets:
+        with open(input_path, "rb") as docx_file:
+            result = mammoth.convert_to_html(docx_file, convert_image=_image_writer(assets))
+        # Relative image names resolve against the asset directory
+        HTML(string=result.value, base_url=Path(assets).as_uri() + "/").write_pdf(
+            output_path,
+            stylesheets=[stylesheet],
+            font_config=font_config,
+        )
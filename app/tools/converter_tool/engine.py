@@ -0,0 +1,136 @@
+"""
+Conversion functions executed inside the converter's worker processes.
+
+Everything here must stay importable without the heavy libraries: weasyprint,
+mammoth and pdf2docx are only imported by the branch that needs them, inside
+the worker. Media conversions shell out to ffmpeg (see media.py), PDF -> DOCX
+can parse pages in sub-processes (opt-in, see pdf.py) and DOCX -> PDF keeps
+its renderer warm per worker (see docx.py).
+"""
+import os
+
+from . import docx, media, pdf
+from .tabular import TABULAR_FORMATS, convert_tabular
+
+IMAGE_FORMATS = ['png', 'jpg', 'jpeg', 'webp', 'bmp']
+
+# Set in each worker process by init_worker(); carries (job_id, fraction) to the parent
+_progress_queue = None
+
+
+# Pipelines that can be set up when a worker starts instead of on first use
+PRELOADERS = {
+    "docx_pdf": docx.warm,
+}
+
+
+def init_worker(progress_queue, preload=()):
+    global _progress_queue
+    _progress_queue = progress_queue
+    for kind in preload:
+        try:
+            PRELOADERS[kind]()
+        except Exception as e:
+            print(f"Could not preload '{kind}' in converter worker: {e}")
+
+
+class ProgressReporter:
+    """Callable handed to long conversions; forwards progress in 1% steps."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.last = -1.0
+
+    def __call__(self, fraction: float):
+        if _progress_queue is None or fraction - self.last < 0.01:
+            return
+        self.last = fraction
+        _progress_queue.put((self.job_id, round(fraction, 3)))
+
+
+class UnsupportedConversion(ValueError):
+    pass
+
+
+def conversion_options(file_ext: str):
+    """Target formats offered for an uploaded file extension."""
+    if file_ext in IMAGE_FORMATS:
+        return [fmt for fmt in ['png', 'jpg', 'webp', 'bmp'] if fmt != file_ext]
+    elif file_ext == 'csv':
+        return ['json', 'ndjson']
+    elif file_ext == 'json':
+        return ['csv', 'ndjson']
+    elif file_ext in ('ndjson', 'jsonl'):
+        return ['csv', 'json']
+    elif file_ext == 'docx':
+        return ['pdf']
+    elif file_ext == 'pdf':
+        return ['docx']
+    elif file_ext == 'mp4':
+        return ['mp3']
+    elif file_ext == 'mp3':
+        return ['mp4']
+    return []
+
+
+def conversion_kind(original_ext: str, target_format: str):
+    """
+    Name of the conversion pipeline, e.g. "image" or "pdf_docx".
+    Used to pick the per-format concurrency limit. None when unsupported.
+    """
+    if original_ext in IMAGE_FORMATS and target_format in IMAGE_FORMATS:
+        return "image"
+    if original_ext in TABULAR_FORMATS and target_format in conversion_options(original_ext):
+        return "tabular"
+    if target_format in conversion_options(original_ext):
+        return f"{original_ext}_{target_format}"
+    return None
+
+
+def convert_image(input_path, output_path, target_format, options=None):
+    """
+    With `max_width`/`max_height` the image is shrunk to fit that box. JPEGs
+    are decoded at a reduced scale via draft(), and thumbnail() uses reduce()
+    before resampling, so large photos are never fully decoded and resized.
+    """
+    from PIL import Image
+    options = options or {}
+    with Image.open(input_path) as img:
+        max_size = (options.get("max_width"), options.get("max_height"))
+        if any(max_size):
+            box = (max_size[0] or img.width, max_size[1] or img.height)
+            img.draft(img.mode, box)
+            img.thumbnail(box, reducing_gap=2.0)
+
+        save_format = target_format.upper()
+        if save_format == 'JPG':
+            save_format = 'JPEG'
+
+        if save_format == 'JPEG':
+            img = img.convert('RGB')
+
+        img.save(output_path, save_format)
+
+
+def convert(input_path: str, output_path: str, original_ext: str, target_format: str, options=None, job_id=None):
+    """Run one conversion. Called in a worker process; returns the output path."""
+    progress = ProgressReporter(job_id) if job_id else None
+    kind = conversion_kind(original_ext, target_format)
+    if kind == "image":
+        convert_image(input_path, output_path, target_format, options)
+    elif kind == "tabular":
+        convert_tabular(input_path, output_path, original_ext, target_format)
+    elif kind == "docx_pdf":
+        docx.convert_docx_to_pdf(input_path, output_path)
+    elif kind == "pdf_docx":
+        pdf.convert_pdf_to_docx(input_path, output_path, options, progress)
+    elif kind == "mp4_mp3":
+        media.convert_mp4_to_mp3(input_path, output_path, progress)
+    elif kind == "mp3_mp4":
+        media.convert_mp3_to_mp4(input_path, output_path, progress)
+    else:
+        raise UnsupportedConversion("Unsupported conversion")
+
+    if not os.path.exists(output_path):
+        raise RuntimeError("Conversion produced no output")
+    return output_path
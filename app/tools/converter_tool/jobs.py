@@ -0,0 +1,342 @@
+"""
+Job-based conversion engine.
+
+Conversions run in a bounded process pool so Pillow, WeasyPrint, pdf2docx and
+ffmpeg never block the event loop. Each pipeline ("image", "pdf_docx", ...)
+has its own concurrency limit, and the total number of queued + running jobs
+is capped by the queue depth. Finished outputs go to the ResultCache, so an
+identical request is answered from disk or joins the job already running.
+Outputs are served through acquire()/release() so the cache cannot evict a
+file that is still being sent.
+
+Tabular conversions requested for a direct download are streamed instead
+(see stream()); they still count against the queue depth and the "tabular"
+concurrency limit and end up in the ResultCache.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Optional
+
+from ...jobqueue import BaseJob, JobQueue
+from ...retention import retention
+from . import engine, tabular
+from .store import ResultCache, cache_key
+
+# Default per-pipeline concurrency; heavy pipelines get fewer slots
+DEFAULT_CONCURRENCY = {
+    "image": 4,
+    "tabular": 2,
+    "docx_pdf": 2,
+    "pdf_docx": 2,
+    "mp4_mp3": 1,
+    "mp3_mp4": 1,
+}
+
+
+@dataclass
+class Job(BaseJob):
+    kind: str
+    input_path: str
+    output_path: str
+    download_filename: str
+    target_format: str = ""
+    options: dict = field(default_factory=dict)
+    error_code: int = 500  # HTTP status to report when the job failed
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "error": self.error,
+            "filename": self.download_filename,
+            "options": self.options,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def parse_concurrency(value: str):
+    """Parse "pdf_docx=2,mp3_mp4=1" into a dict."""
+    limits = {}
+    for part in filter(None, (p.strip() for p in value.split(","))):
+        kind, _, limit = part.partition("=")
+        limits[kind.strip()] = int(limit)
+    return limits
+
+
+class ConversionEngine(JobQueue):
+    full_message = "Conversion queue is full, try again later"
+
+    def __init__(self, max_workers: Optional[int] = None, queue_depth: int = 32, concurrency: Optional[dict] = None,
+                 cache: Optional[ResultCache] = None, preload=()):
+        super().__init__(queue_depth, cache)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.concurrency = {**DEFAULT_CONCURRENCY, **(concurrency or {})}
+        # Pipelines each worker process sets up as soon as it starts
+        self.preload = tuple(preload)
+        self._pool = None
+        self._loop = None
+        self._progress_queue = None
+        self._semaphores = {}
+
+    @classmethod
+    def from_env(cls, cache_dir: str):
+        return cls(
+            max_workers=int(os.getenv("CONVERTER_WORKERS", "0")) or None,
+            queue_depth=int(os.getenv("CONVERTER_QUEUE_DEPTH", "32")),
+            concurrency=parse_concurrency(os.getenv("CONVERTER_CONCURRENCY", "")),
+            cache=ResultCache(cache_dir, int(os.getenv("CONVERTER_CACHE_MB", "1024")) * 1024 * 1024),
+            preload=[kind.strip() for kind in os.getenv("CONVERTER_PRELOAD", "").split(",") if kind.strip()],
+        )
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking a process that runs an event loop and threads is unsafe
+            context = multiprocessing.get_context("spawn")
+            if self._progress_queue is None:
+                self._loop = asyncio.get_running_loop()
+                self._progress_queue = context.Queue()
+                threading.Thread(target=self._read_progress, daemon=True).start()
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=context,
+                initializer=engine.init_worker,
+                initargs=(self._progress_queue, self.preload),
+            )
+        return self._pool
+
+    def _read_progress(self):
+        """Thread relaying (job_id, fraction) messages from the workers to the loop."""
+        while True:
+            job_id, fraction = self._progress_queue.get()
+            try:
+                self._loop.call_soon_threadsafe(self._on_progress, job_id, fraction)
+            except RuntimeError:
+                # Loop closed at shutdown while a worker was still reporting
+                return
+
+    def _on_progress(self, job_id: str, fraction: float):
+        job = self.jobs.get(job_id)
+        if job and job.status == "running":
+            job.update(progress=fraction)
+
+    def _semaphore(self, kind: str) -> asyncio.Semaphore:
+        if kind not in self._semaphores:
+            self._semaphores[kind] = asyncio.Semaphore(self.concurrency.get(kind, 1))
+        return self._semaphores[kind]
+
+    def new_jobs(self, content_hashes, target_format: str, options: Optional[dict] = None) -> int:
+        """
+        Number of jobs submitting these inputs would start: cached results,
+        conversions already in flight and repeats within the list start none.
+        """
+        if not self.cache:
+            return len(content_hashes)
+        return self._count_new(cache_key(content_hash, target_format, options or {}) for content_hash in content_hashes)
+
+    def submit(self, input_path: str, original_ext: str, target_format: str, download_filename: str,
+               content_hash: Optional[str] = None, options: Optional[dict] = None) -> Job:
+        """
+        Queue a conversion. Raises UnsupportedConversion or QueueFull.
+
+        With a content hash, a cached result comes back as an already finished
+        job and an identical conversion in progress is shared. Batches call
+        check_queue(new_jobs(...)) first so they are admitted whole or not at all.
+        """
+        kind = engine.conversion_kind(original_ext, target_format)
+        if kind is None:
+            raise engine.UnsupportedConversion("Unsupported conversion")
+        options = options or {}
+        self._forget_expired()
+        retention.touch(input_path)
+
+        key = None
+        if self.cache and content_hash:
+            key = cache_key(content_hash, target_format, options)
+            job = self._cached_job(key, kind, input_path, target_format, download_filename, options)
+            # Or follow the same conversion in flight, under this request's download name
+            job = job or self._join(key, download_filename=download_filename)
+            if job:
+                return job
+
+        self.check_queue()
+
+        job = Job(
+            id=str(uuid.uuid4()),
+            kind=kind,
+            input_path=input_path,
+            output_path=self.cache.temp_path(target_format) if self.cache else f"{input_path}.{target_format}",
+            download_filename=download_filename,
+            target_format=target_format,
+            options=options,
+            cache_key=key,
+        )
+        self._start(job, self._run(job, original_ext, target_format))
+        return job
+
+    def _cached_job(self, key: str, kind: str, input_path: str, target_format: str, download_filename: str,
+                    options: dict) -> Optional[Job]:
+        cached_path = self.cache.get(key)
+        if not cached_path:
+            return None
+        job = Job(
+            id=str(uuid.uuid4()),
+            kind=kind,
+            input_path=input_path,
+            output_path=cached_path,
+            download_filename=download_filename,
+            target_format=target_format,
+            options=options,
+            cache_key=key,
+            status="done",
+            progress=1.0,
+            finished_at=time.time(),
+        )
+        return self._add(job)
+
+    def cached(self, input_path: str, original_ext: str, target_format: str, download_filename: str,
+               content_hash: Optional[str] = None) -> Optional[Job]:
+        """Finished job for a conversion already in the ResultCache, else None."""
+        if not (self.cache and content_hash):
+            return None
+        retention.touch(input_path)
+        key = cache_key(content_hash, target_format, {})
+        return self._cached_job(key, engine.conversion_kind(original_ext, target_format), input_path,
+                                target_format, download_filename, {})
+
+    async def stream(self, input_path: str, original_ext: str, target_format: str, download_filename: str,
+                     content_hash: Optional[str] = None):
+        """
+        Tabular conversion as an async iterator of text chunks, for a
+        StreamingResponse. Raises QueueFull, or ValueError when the input is
+        malformed (the first chunk is produced before returning).
+
+        It runs in the threadpool rather than the process pool: a generator
+        cannot be handed back from a worker process, and the work is mostly
+        reading and JSON encoding. Everything else is as for submit(): it
+        counts against the queue depth and the "tabular" limit, and the full
+        output is stored in the ResultCache for the next request.
+        """
+        self._forget_expired()
+        self.check_queue()
+        retention.touch(input_path)
+        job = Job(
+            id=str(uuid.uuid4()),
+            kind="tabular",
+            input_path=input_path,
+            output_path=self.cache.temp_path(target_format) if self.cache else f"{input_path}.{target_format}",
+            download_filename=download_filename,
+            target_format=target_format,
+            cache_key=cache_key(content_hash, target_format, {}) if self.cache and content_hash else None,
+        )
+        self._add(job)
+        semaphore = self._semaphore(job.kind)
+        await semaphore.acquire()
+        retention.pin(input_path)
+        job.update(status="running")
+        try:
+            chunks = tabular.conversion_chunks(input_path, original_ext, target_format)
+            chunks = await asyncio.to_thread(tabular.prime, tabular.tee(chunks, job.output_path, target_format))
+        except BaseException as e:
+            self._end_stream(job, semaphore, e)
+            raise
+        return self._relay(job, chunks, semaphore)
+
+    async def _relay(self, job: Job, chunks, semaphore: asyncio.Semaphore):
+        error = None
+        try:
+            while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+                yield chunk
+        except BaseException as e:
+            # Malformed row further down, or the client went away
+            error = e
+            raise
+        finally:
+            self._end_stream(job, semaphore, error)
+            try:
+                chunks.close()
+            except ValueError:
+                # Cancelled while a chunk was being produced; it is closed once collected
+                pass
+
+    def _end_stream(self, job: Job, semaphore: asyncio.Semaphore, error: Optional[BaseException]):
+        semaphore.release()
+        retention.unpin(job.input_path)
+        if error is not None:
+            job.update(status="failed", error=str(error) or type(error).__name__, finished_at=time.time())
+            if os.path.exists(job.output_path):
+                os.remove(job.output_path)
+            return
+        output_path, key = job.output_path, job.cache_key
+        if self.cache:
+            key = key or uuid.uuid4().hex
+            output_path = self.cache.put(key, job.output_path, job.target_format)
+        job.update(status="done", progress=1.0, output_path=output_path, cache_key=key, finished_at=time.time())
+
+    async def _run(self, job: Job, original_ext: str, target_format: str):
+        # Keep the retention sweep away from the input while it is converted
+        retention.pin(job.input_path)
+        try:
+            await self._convert(job, original_ext, target_format)
+        finally:
+            retention.unpin(job.input_path)
+            if job.status == "failed" and os.path.exists(job.output_path):
+                os.remove(job.output_path)
+
+    async def _convert(self, job: Job, original_ext: str, target_format: str):
+        async with self._semaphore(job.kind):
+            job.update(status="running")
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(
+                    self.pool, engine.convert,
+                    job.input_path, job.output_path, original_ext, target_format, job.options, job.id,
+                )
+                output_path, key = job.output_path, job.cache_key
+                if self.cache:
+                    key = key or uuid.uuid4().hex
+                    output_path = self.cache.put(key, job.output_path, target_format)
+                job.update(status="done", progress=1.0, output_path=output_path, cache_key=key, finished_at=time.time())
+            except BrokenProcessPool as e:
+                # A worker died (e.g. OOM); start a fresh pool for the next jobs
+                self._pool = None
+                job.update(status="failed", error=f"Conversion worker crashed: {e}", finished_at=time.time())
+            except ValueError as e:
+                # Bad input (e.g. JSON that is not a list of objects)
+                job.update(status="failed", error=str(e), error_code=400, finished_at=time.time())
+            except Exception as e:
+                job.update(status="failed", error=str(e), finished_at=time.time())
+
+    def acquire(self, job: Job) -> Optional[str]:
+        """Output of a finished job, kept from eviction until release(); None if it is gone."""
+        if self.cache is None:
+            return job.output_path if os.path.exists(job.output_path) else None
+        return self.cache.acquire(job.cache_key)
+
+    def release(self, job: Job):
+        if self.cache is not None:
+            self.cache.release(job.cache_key)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self):
+        return {
+            "workers": self.max_workers,
+            "queue_depth": self.queue_depth,
+            "pending": self.pending(),
+            "concurrency": self.concurrency,
+            "cache": self.cache.stats() if self.cache else None,
+        }
@@ -0,0 +1,103 @@
+"""
+Media conversions driven by ffmpeg directly.
+
+MP4 -> MP3 stream-copies the audio track when it already is MP3 and only
+re-encodes otherwise. MP3 -> MP4 muxes the audio with a single black frame
+repeated at 1 fps (x264 stillimage), copying the audio when the codec fits
+in MP4. No frames pass through Python; progress is read from
+`ffmpeg -progress`.
+"""
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+
+DURATION = re.compile(rb"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+AUDIO_STREAM = re.compile(rb"Stream #\d+:\d+.*?: Audio: (\w+)")
+
+# Audio codecs the MP4 container carries as-is
+MP4_AUDIO_COPY = {"aac", "mp3"}
+
+# How much of ffmpeg's error output ends up in the job error
+ERROR_TAIL = 500
+
+
+def ffmpeg_binary() -> str:
+    """FFMPEG_BINARY, then ffmpeg on PATH, then the binary bundled with imageio-ffmpeg."""
+    binary = os.getenv("FFMPEG_BINARY") or shutil.which("ffmpeg")
+    if binary:
+        return binary
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        raise RuntimeError("ffmpeg is not installed")
+
+
+def probe(input_path: str):
+    """Return (duration in seconds or None, audio codec or None) from ffmpeg's input banner."""
+    result = subprocess.run(
+        [ffmpeg_binary(), "-hide_banner", "-i", input_path],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    duration = None
+    match = DURATION.search(result.stderr)
+    if match:
+        hours, minutes, seconds = match.groups()
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    match = AUDIO_STREAM.search(result.stderr)
+    codec = match.group(1).decode() if match else None
+    return duration, codec
+
+
+def run_ffmpeg(args, duration=None, progress=None):
+    """Run ffmpeg with `-progress` on stdout, reporting 0..1 through `progress`."""
+    cmd = [ffmpeg_binary(), "-hide_banner", "-nostdin", "-y", "-loglevel", "error", "-progress", "pipe:1", "-nostats"] + args
+    # stderr goes to a file: a damaged input can log more than a pipe buffer
+    # of errors while stdout is still being read, which would block ffmpeg
+    with tempfile.TemporaryFile() as errors:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=errors)
+        for line in proc.stdout:
+            if progress and duration and line.startswith(b"out_time_us="):
+                value = line.split(b"=", 1)[1].strip()
+                if value.isdigit():
+                    progress(min(int(value) / (duration * 1_000_000), 1.0))
+        if proc.wait() != 0:
+            size = errors.seek(0, os.SEEK_END)
+            errors.seek(max(size - ERROR_TAIL, 0))
+            tail = errors.read().decode(errors='replace').strip()
+            raise RuntimeError(f"ffmpeg failed: {tail}")
+
+
+def convert_mp4_to_mp3(input_path, output_path, progress=None):
+    duration, codec = probe(input_path)
+    if codec is None:
+        raise ValueError("The video has no audio track")
+    if codec == "mp3":
+        audio = ["-c:a", "copy"]
+    else:
+        audio = ["-c:a", "libmp3lame", "-b:a", "192k"]
+    run_ffmpeg(["-i", input_path, "-vn", "-map", "0:a:0"] + audio + [output_path], duration, progress)
+
+
+def convert_mp3_to_mp4(input_path, output_path, progress=None):
+    duration, codec = probe(input_path)
+    if codec is None:
+        raise ValueError("The file has no audio track")
+    audio = ["-c:a", "copy"] if codec in MP4_AUDIO_COPY else ["-c:a", "aac", "-b:a", "192k"]
+    run_ffmpeg(
+        [
+            # One black 640x480 frame per second is all the video track needs
+            "-f", "lavfi", "-i", "color=c=black:s=640x480:r=1",
+            "-i", input_path,
+            "-map", "0:v", "-map", "1:a:0",
+            "-c:v", "libx264", "-tune", "stillimage", "-preset", "ultrafast", "-pix_fmt", "yuv420p", "-r", "1",
+            *audio,
+            "-shortest", "-movflags", "+faststart",
+            output_path,
+        ],
+        duration,
+        progress,
+    )
@@ -0,0 +1,164 @@
+"""
+PDF -> DOCX with page ranges, optional multi-process page parsing and progress.
+
+pdf2docx's own multi_processing mode writes fixed-name JSON files to the
+working directory (unsafe with concurrent jobs) and reports no progress, so
+the page split is done here with its public steps instead: each sub-process
+loads its share of pages, parses them and returns `Converter.store()`; the
+parent restores all of them and runs `make_docx` once.
+"""
+import logging
+import multiprocessing
+import os
+import queue
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Page-parsing processes per conversion (capped by the number of pages). They
+# are spawned by the conversion worker, on top of the engine's process pool
+# and its "pdf_docx" limit, so by default pages are parsed in the worker itself.
+PDF_DOCX_WORKERS = max(1, int(os.getenv("PDF_DOCX_WORKERS", "1")))
+
+# Each extra process re-opens and pre-analyses the document; below this many
+# pages per process the start-up cost outweighs the parallel parsing
+PDF_DOCX_MIN_PAGES_PER_WORKER = int(os.getenv("PDF_DOCX_MIN_PAGES_PER_WORKER", "10"))
+
+# Share of the progress bar spent parsing; make_docx takes the rest
+PARSE_SHARE = 0.9
+
+# Skips table detection and vector-graphic clipping (the slow part of image
+# analysis); text, paragraphs and embedded raster images are kept
+TEXT_ONLY_SETTINGS = {
+    "parse_lattice_table": False,
+    "parse_stream_table": False,
+    "min_svg_w": 1e6,
+    "min_svg_h": 1e6,
+}
+
+# Set in page-parsing sub-processes; receives one item per parsed page
+_page_queue = None
+
+
+def parse_page_range(value, page_count: int):
+    """
+    Turn "1-3,5,8-" (1-based, inclusive) into sorted 0-based page indexes.
+    Empty means every page.
+    """
+    if not value or not str(value).strip():
+        return list(range(page_count))
+    indexes = set()
+    for part in str(value).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, dash, last = part.partition("-")
+        try:
+            start = int(first) if first.strip() else 1
+            end = (int(last) if last.strip() else page_count) if dash else start
+        except ValueError:
+            raise ValueError(f"Invalid page range: {part}")
+        if start < 1 or end > page_count or start > end:
+            raise ValueError(f"Page range {part} is outside 1-{page_count}")
+        indexes.update(range(start - 1, end))
+    return sorted(indexes)
+
+
+def _init_page_worker(page_queue):
+    global _page_queue
+    _page_queue = page_queue
+
+
+def _parse_loaded(cv, indexes, settings: dict, on_page):
+    """Same as Converter.parse() for the given pages, with a per-page callback."""
+    cv.load_pages(pages=indexes).parse_document(**settings)
+    for page in cv.pages:
+        if page.skip_parsing:
+            continue
+        try:
+            page.parse(**settings)
+        except Exception as e:
+            if not settings["ignore_page_error"]:
+                raise
+            logger.error("Ignore page %d due to parsing page error: %s", page.id + 1, e)
+        on_page()
+
+
+def _parse_pages(pdf_path: str, indexes, settings: dict):
+    """Sub-process entry point: parse the given pages and return the stored result."""
+    from pdf2docx import Converter
+    cv = Converter(pdf_path)
+    try:
+        _parse_loaded(cv, indexes, settings, lambda: _page_queue.put(1))
+        return cv.store()
+    finally:
+        cv.close()
+
+
+def _chunks(indexes, count: int):
+    """Split indexes into `count` contiguous, nearly equal chunks."""
+    size, extra = divmod(len(indexes), count)
+    chunks, start = [], 0
+    for i in range(count):
+        end = start + size + (1 if i < extra else 0)
+        chunks.append(indexes[start:end])
+        start = end
+    return [chunk for chunk in chunks if chunk]
+
+
+def _parse_in_processes(pdf_path: str, indexes, settings: dict, workers: int, on_page):
+    context = multiprocessing.get_context("spawn")
+    page_queue = context.Queue()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_page_worker,
+        initargs=(page_queue,),
+    ) as pool:
+        futures = [pool.submit(_parse_pages, pdf_path, chunk, settings) for chunk in _chunks(indexes, workers)]
+        while not all(future.done() for future in futures):
+            try:
+                page_queue.get(timeout=0.2)
+                on_page()
+            except queue.Empty:
+                pass
+        return [future.result() for future in futures]
+
+
+def convert_pdf_to_docx(input_path, output_path, options=None, progress=None):
+    """
+    Options: `pages` ("1-3,5") and `text_only` (skip table and vector-graphic
+    analysis). With PDF_DOCX_WORKERS > 1, long documents are parsed by that
+    many sub-processes.
+    """
+    from pdf2docx import Converter
+    options = options or {}
+
+    cv = Converter(input_path)
+    try:
+        settings = cv.default_settings
+        if options.get("text_only"):
+            settings.update(TEXT_ONLY_SETTINGS)
+
+        indexes = parse_page_range(options.get("pages"), len(cv.fitz_doc))
+        workers = max(1, min(PDF_DOCX_WORKERS, len(indexes) // PDF_DOCX_MIN_PAGES_PER_WORKER))
+
+        parsed = 0
+
+        def on_page():
+            nonlocal parsed
+            parsed += 1
+            if progress:
+                progress(PARSE_SHARE * parsed / len(indexes))
+
+        if workers == 1:
+            _parse_loaded(cv, indexes, settings, on_page)
+        else:
+            for data in _parse_in_processes(input_path, indexes, settings, workers, on_page):
+                cv.restore(data)
+
+        cv.make_docx(output_path, **settings)
+        if progress:
+            progress(1.0)
+    finally:
+        cv.close()
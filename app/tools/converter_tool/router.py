@@ -1,13 +1,20 @@
-from fastapi import APIRouter, Request, UploadFile, File, Form, HTTPException
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
+from fastapi import APIRouter, Request, Form, HTTPException
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
-import shutil
+from fastapi.concurrency import iterate_in_threadpool
+import asyncio
 import os
-import uuid
-import mammoth
-from weasyprint import HTML
-from moviepy import VideoFileClip, AudioFileClip, ColorClip
-from pdf2docx import Converter
+import re
+from functools import partial
+from typing import Optional
+from ...jobqueue import QueueFull
+from ...responses import JobEventsResponse, ReleasingFileResponse
+from ...retention import retention
+from ...zipstream import ZipStream
+from .engine import conversion_options, conversion_kind, UnsupportedConversion, IMAGE_FORMATS
+from .jobs import ConversionEngine
+from .store import ContentStore
+from .upload import receive_upload, receive_form, UploadRejected
 
 router = APIRouter()
 templates = Jinja2Templates(directory=["app/templates", "app/tools/converter_tool/templates"])
@@ -16,135 +23,274 @@ templates = Jinja2Templates(directory=["app/templates", "app/tools/converter_too
 UPLOAD_DIR = "app/static/uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Uploads are stored once per content hash; converted outputs are cached per
+# (content hash, target format, options)
+upload_store = ContentStore(UPLOAD_DIR)
+conversion_engine = ConversionEngine.from_env(cache_dir=os.path.join(UPLOAD_DIR, "results"))
+# Cached results count against the "uploads" retention quota and age limit
+retention.attach("uploads", conversion_engine.cache)
+
+def shutdown():
+    """Called by the tool registry at app shutdown: stop the worker processes."""
+    conversion_engine.shutdown()
+
+CONTENT_HASH = re.compile(r"^[0-9a-f]{64}$")
+# 1-based page selection for PDF -> DOCX, e.g. "1-3,5,8-"
+PAGE_RANGE = re.compile(r"^(\d*-?\d*)(,\d*-?\d*)*$")
+
+BATCH_MAX_FILES = int(os.getenv("CONVERTER_BATCH_MAX_FILES", "100"))
+MAX_DIMENSION = 10000
+
+TABULAR_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "jsonl": "application/x-ndjson",
+}
+
 @router.get("/tools/converter", response_class=HTMLResponse)
 async def converter_page(request: Request):
     return templates.TemplateResponse("converter.html", {"request": request})
 
 @router.post("/tools/converter/upload")
-async def upload_file(file: UploadFile = File(...)):
-    file_ext = file.filename.split('.')[-1].lower()
-    file_id = str(uuid.uuid4())
-    file_path = os.path.join(UPLOAD_DIR, f"{file_id}.{file_ext}")
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    options = []
-    if file_ext in ['png', 'jpg', 'jpeg', 'webp', 'bmp']:
-        options = [fmt for fmt in ['png', 'jpg', 'webp', 'bmp'] if fmt != file_ext]
-    elif file_ext == 'csv':
-        options = ['json']
-    elif file_ext == 'json':
-        options = ['csv']
-    elif file_ext == 'docx':
-        options = ['pdf']
-    elif file_ext == 'pdf':
-        options = ['docx']
-    elif file_ext == 'mp4':
-        options = ['mp3']
-    elif file_ext == 'mp3':
-        options = ['mp4']
-    
+async def upload_file(request: Request):
+    """
+    Multipart upload with a `file` field, parsed as it streams in. The format
+    is sniffed from the first bytes, so `file_ext` may differ from the name.
+    """
+    try:
+        upload = await receive_upload(request, upload_store)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
     return JSONResponse(content={
-        "file_id": file_id,
-        "file_ext": file_ext,
-        "options": options
+        "file_id": upload.digest,
+        "file_ext": upload.ext,
+        "options": conversion_options(upload.ext),
+        "size": upload.size,
     })
 
+def _input_path(file_id: str, original_ext: str):
+    input_path = upload_store.path_for(file_id, original_ext)
+    if not os.path.exists(input_path):
+        raise HTTPException(status_code=404, detail="File not found")
+    return input_path
+
+def _download_filename(original_filename: str, target_format: str):
+    # Construct new filename: [original_name]_converted.[target_format]
+    base_name = os.path.splitext(original_filename)[0]
+    return f"{base_name}_converted.{target_format}"
+
+def _pdf_options(pages: Optional[str], text_only: bool):
+    """PDF -> DOCX options; part of the cache key, so only set what differs from the defaults."""
+    options = {}
+    pages = "".join((pages or "").split())
+    if pages:
+        if not PAGE_RANGE.match(pages):
+            raise HTTPException(status_code=400, detail="pages must look like 1-3,5,8-")
+        options["pages"] = pages
+    if text_only:
+        options["text_only"] = True
+    return options
+
+def _submit_job(file_id: str, target_format: str, original_ext: str, original_filename: str, options=None):
+    input_path = _input_path(file_id, original_ext)
+    download_filename = _download_filename(original_filename, target_format)
+
+    try:
+        return conversion_engine.submit(
+            input_path,
+            original_ext,
+            target_format,
+            download_filename,
+            # Older uploads were named by uuid; only real content hashes are cacheable
+            content_hash=file_id if CONTENT_HASH.match(file_id) else None,
+            options=options,
+        )
+    except UnsupportedConversion as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+def _send_result(job, media_type: Optional[str] = None):
+    """FileResponse for a finished job; the output cannot be evicted until it is sent."""
+    path = conversion_engine.acquire(job)
+    if path is None:
+        raise HTTPException(status_code=410, detail="File is no longer available")
+    return ReleasingFileResponse(path, partial(conversion_engine.release, job), filename=job.download_filename,
+                                 media_type=media_type)
+
+def _get_job(job_id: str):
+    job = conversion_engine.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @router.post("/tools/converter/convert")
 async def convert_file(
-    file_id: str = Form(...), 
-    target_format: str = Form(...), 
+    file_id: str = Form(...),
+    target_format: str = Form(...),
     original_ext: str = Form(...),
-    original_filename: str = Form(...)
+    original_filename: str = Form(...),
+    pages: Optional[str] = Form(None),
+    text_only: bool = Form(False)
 ):
-    input_path = os.path.join(UPLOAD_DIR, f"{file_id}.{original_ext}")
-    output_filename = f"{file_id}.{target_format}"
-    output_path = os.path.join(UPLOAD_DIR, output_filename)
-    
-    if not os.path.exists(input_path):
-        raise HTTPException(status_code=404, detail="File not found")
-    
+    """
+    Convert and wait for the result (the work itself runs in the process pool).
+    PDF -> DOCX also takes `pages` ("1-3,5") and `text_only`.
+    """
+    kind = conversion_kind(original_ext, target_format)
+    if kind == "tabular":
+        return await _stream_tabular(file_id, target_format, original_ext, original_filename)
+
+    options = _pdf_options(pages, text_only) if kind == "pdf_docx" else None
+    job = _submit_job(file_id, target_format, original_ext, original_filename, options)
+    await conversion_engine.result(job)
+
+    if job.status != "done":
+        raise HTTPException(status_code=job.error_code, detail=job.error)
+    return _send_result(job)
+
+async def _stream_tabular(file_id: str, target_format: str, original_ext: str, original_filename: str):
+    """
+    CSV/JSON/NDJSON are converted row by row straight into the response
+    (through the engine, so the queue bound and result cache apply).
+    """
+    input_path = _input_path(file_id, original_ext)
+    download_filename = _download_filename(original_filename, target_format)
+    content_hash = file_id if CONTENT_HASH.match(file_id) else None
+    cached = conversion_engine.cached(input_path, original_ext, target_format, download_filename, content_hash)
+    if cached is not None:
+        return _send_result(cached, media_type=TABULAR_MEDIA_TYPES[target_format])
+    try:
+        chunks = await conversion_engine.stream(input_path, original_ext, target_format, download_filename, content_hash)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return StreamingResponse(
+        chunks,
+        media_type=TABULAR_MEDIA_TYPES[target_format],
+        headers={"Content-Disposition": f'attachment; filename="{download_filename}"'},
+    )
+
+def _dimension(fields: dict, name: str):
+    value = fields.get(name, "").strip()
+    if not value:
+        return None
+    if not value.isdigit() or not 0 < int(value) <= MAX_DIMENSION:
+        raise HTTPException(status_code=400, detail=f"{name} must be between 1 and {MAX_DIMENSION}")
+    return int(value)
+
+@router.post("/tools/converter/batch")
+async def convert_batch(request: Request):
+    """
+    Convert many images at once. Multipart fields: `files` (repeated),
+    `target_format`, and optional `max_width` / `max_height` to shrink each
+    image to fit that box. Images are converted in parallel on the process
+    pool and the zip streams back as they finish; failures are listed in
+    errors.txt inside the archive.
+    """
     try:
-        # Image Conversion
-        if original_ext in ['png', 'jpg', 'jpeg', 'webp', 'bmp']:
-            from PIL import Image
-            with Image.open(input_path) as img:
-                save_format = target_format.upper()
-                if save_format == 'JPG':
-                    save_format = 'JPEG'
-                
-                if save_format == 'JPEG':
-                    img = img.convert('RGB')
-                
-                img.save(output_path, save_format)
-        
-        # CSV to JSON
-        elif original_ext == 'csv' and target_format == 'json':
-            import csv
-            import json
-            data = []
-            with open(input_path, 'r', encoding='utf-8') as csvf:
-                reader = csv.DictReader(csvf)
-                for row in reader:
-                    data.append(row)
-            with open(output_path, 'w', encoding='utf-8') as jsonf:
-                json.dump(data, jsonf, indent=4)
-        
-        # JSON to CSV
-        elif original_ext == 'json' and target_format == 'csv':
-            import csv
-            import json
-            with open(input_path, 'r', encoding='utf-8') as jsonf:
-                data = json.load(jsonf)
-            
-            if isinstance(data, list) and len(data) > 0 and isinstance(data[0], dict):
-                headers = data[0].keys()
-                with open(output_path, 'w', newline='', encoding='utf-8') as csvf:
-                    writer = csv.DictWriter(csvf, fieldnames=headers)
-                    writer.writeheader()
-                    writer.writerows(data)
-            else:
-                raise HTTPException(status_code=400, detail="Invalid JSON structure for CSV conversion")
-        
-        # DOCX -> PDF
-        elif original_ext == 'docx' and target_format == 'pdf':
-            with open(input_path, "rb") as docx_file:
-                result = mammoth.convert_to_html(docx_file)
-                html = result.value
-                HTML(string=html).write_pdf(output_path)
-
-        # PDF -> DOCX
-        elif original_ext == 'pdf' and target_format == 'docx':
-            cv = Converter(input_path)
-            cv.convert(output_path)
-            cv.close()
-
-        # MP4 -> MP3
-        elif original_ext == 'mp4' and target_format == 'mp3':
-            video = VideoFileClip(input_path)
-            video.audio.write_audiofile(output_path)
-            video.close()
-
-        # MP3 -> MP4
-        elif original_ext == 'mp3' and target_format == 'mp4':
-            audio = AudioFileClip(input_path)
-            # Create a black background video with the same duration as the audio
-            # Size 640x480 is arbitrary but standard
-            video = ColorClip(size=(640, 480), color=(0, 0, 0), duration=audio.duration)
-            video = video.set_audio(audio)
-            video.write_videofile(output_path, fps=24)
-            audio.close()
-            video.close()
-        
-        else:
-             raise HTTPException(status_code=400, detail="Unsupported conversion")
-             
-        # Construct new filename: [original_name]_converted.[target_format]
-        base_name = os.path.splitext(original_filename)[0]
-        download_filename = f"{base_name}_converted.{target_format}"
-        
-        return FileResponse(output_path, filename=download_filename)
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        # Cheap early check; the whole batch is checked once its size is known
+        conversion_engine.check_queue()
+        uploads, fields = await receive_form(request, upload_store, file_field="files", max_files=BATCH_MAX_FILES,
+                                             categories={"image"})
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    # Everything is validated before the first job is submitted
+    target_format = fields.get("target_format", "").lower()
+    if target_format not in IMAGE_FORMATS:
+        raise HTTPException(status_code=400, detail="target_format must be an image format")
+    options = {}
+    for name in ("max_width", "max_height"):
+        if (value := _dimension(fields, name)) is not None:
+            options[name] = value
+    # Only conversions that are not cached or already running take a queue slot
+    new_jobs = conversion_engine.new_jobs([upload.digest for upload in uploads], target_format, options)
+    if new_jobs > conversion_engine.queue_depth:
+        # Would never fit, however long the client waits
+        raise HTTPException(status_code=413,
+                            detail=f"At most {conversion_engine.queue_depth} new conversions per batch")
+    try:
+        conversion_engine.check_queue(new_jobs)
+        jobs = [
+            conversion_engine.submit(
+                upload.path,
+                upload.ext,
+                target_format,
+                _download_filename(upload.filename, target_format),
+                content_hash=upload.digest,
+                options=options,
+            )
+            for upload in uploads
+        ]
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    async def finished(job):
+        return await conversion_engine.result(job)
+
+    async def zip_stream():
+        archive = ZipStream()
+        errors = []
+        for next_done in asyncio.as_completed([finished(job) for job in jobs]):
+            job = await next_done
+            path = conversion_engine.acquire(job) if job.status == "done" else None
+            if path is None:
+                errors.append(f"{job.download_filename}: {job.error or 'File is no longer available'}")
+                continue
+            try:
+                async for chunk in iterate_in_threadpool(archive.iter_file(path, job.download_filename)):
+                    if chunk:
+                        yield chunk
+            finally:
+                conversion_engine.release(job)
+        if errors:
+            yield archive.add_bytes("errors.txt", "\n".join(errors).encode())
+        yield archive.close()
+
+    return StreamingResponse(
+        zip_stream(),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="converted_{target_format}.zip"'},
+    )
+
+@router.post("/tools/converter/jobs", status_code=202)
+async def create_job(
+    file_id: str = Form(...),
+    target_format: str = Form(...),
+    original_ext: str = Form(...),
+    original_filename: str = Form(...),
+    pages: Optional[str] = Form(None),
+    text_only: bool = Form(False)
+):
+    options = _pdf_options(pages, text_only) if conversion_kind(original_ext, target_format) == "pdf_docx" else None
+    job = _submit_job(file_id, target_format, original_ext, original_filename, options)
+    return JSONResponse(status_code=202, content=job.to_dict())
+
+@router.get("/tools/converter/jobs")
+async def engine_stats():
+    return conversion_engine.stats()
+
+@router.get("/tools/converter/jobs/{job_id}")
+async def job_status(job_id: str):
+    return _get_job(job_id).to_dict()
+
+@router.get("/tools/converter/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-Sent Events stream of status updates until the job finishes."""
+    return JobEventsResponse(_get_job(job_id), conversion_engine)
+
+@router.get("/tools/converter/jobs/{job_id}/download")
+async def job_download(job_id: str):
+    job = _get_job(job_id)
+    if job.status == "failed":
+        raise HTTPException(status_code=job.error_code, detail=job.error)
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    return _send_result(job)
@@ -0,0 +1,52 @@
+"""
+Content-addressed storage for converter uploads and conversion results.
+
+Uploads are hashed while they are written and stored once per SHA-256 digest,
+so the same file uploaded twice shares one copy on disk. Conversion outputs
+are cached by (content hash, target format, options) with size-bounded LRU
+eviction (see app/filecache.py).
+"""
+import hashlib
+import json
+import os
+
+from ...filecache import FileCache
+
+
+class ContentStore:
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, digest: str, ext: str) -> str:
+        return os.path.join(self.root, f"{digest}.{ext}")
+
+    def commit(self, tmp_path: str, digest: str, ext: str):
+        """Move a fully written temp file to its content address (keeps the existing copy)."""
+        path = self.path_for(digest, ext)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            # Refresh mtime so age-based cleanup treats it as recently used
+            os.utime(path)
+        else:
+            os.replace(tmp_path, path)
+        return digest, path
+
+
+def cache_key(content_hash: str, target_format: str, options=None) -> str:
+    raw = json.dumps([content_hash, target_format, options or {}], sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class ResultCache(FileCache):
+    """On-disk LRU of conversion outputs, bounded by total bytes."""
+
+    def path_for(self, key: str, ext: str) -> str:
+        return os.path.join(self.root, f"{key}.{ext}")
+
+    def temp_path(self, ext: str) -> str:
+        return super().temp_path(f".{ext}")
+
+    def put(self, key: str, src_path: str, ext: str) -> str:
+        """Move a finished output into the cache and return its cached path."""
+        return self._put(key, src_path, self.path_for(key, ext))
@@ -0,0 +1,220 @@
+"""
+Streaming CSV / JSON / NDJSON conversion.
+
+Rows are read and written one at a time, so memory stays flat regardless of
+file size. JSON arrays are parsed incrementally with JSONDecoder.raw_decode
+over a sliding buffer that never holds more than one element (up to
+MAX_RECORD_CHARS, so a malformed element cannot make it grow until EOF);
+every converter is a generator of text chunks that can
+feed either a file or a StreamingResponse.
+"""
+import csv
+import io
+import json
+
+CHUNK_SIZE = 64 * 1024
+
+# Largest single JSON element / NDJSON line accepted
+MAX_RECORD_CHARS = 16 * 1024 * 1024
+
+TABULAR_FORMATS = ['csv', 'json', 'ndjson', 'jsonl']
+
+
+class InvalidStructure(ValueError):
+    pass
+
+
+def _fill(f, buf: str, pos: int):
+    """Drop consumed text and append the next chunk. Returns (buf, pos, eof)."""
+    chunk = f.read(CHUNK_SIZE)
+    return buf[pos:] + chunk, 0, not chunk
+
+
+def _check_record_size(size: int):
+    if size > MAX_RECORD_CHARS:
+        raise InvalidStructure(f"JSON record larger than {MAX_RECORD_CHARS // (1024 * 1024)} MB (or malformed)")
+
+
+def iter_json_array(f):
+    """Yield the elements of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = _fill(f, "", 0)
+
+    # Opening bracket
+    while True:
+        while pos < len(buf) and buf[pos].isspace():
+            pos += 1
+        if pos < len(buf) or eof:
+            break
+        buf, pos, eof = _fill(f, buf, pos)
+    if pos >= len(buf) or buf[pos] != "[":
+        raise InvalidStructure("Expected a JSON array")
+    pos += 1
+
+    expect_value = True
+    while True:
+        while pos < len(buf) and buf[pos].isspace():
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                raise InvalidStructure("Unterminated JSON array")
+            buf, pos, eof = _fill(f, buf, pos)
+            continue
+
+        char = buf[pos]
+        if char == "]":
+            return
+        if not expect_value:
+            if char != ",":
+                raise InvalidStructure(f"Unexpected character {char!r} in JSON array")
+            pos += 1
+            expect_value = True
+            continue
+
+        try:
+            value, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise InvalidStructure("Invalid JSON")
+            _check_record_size(len(buf) - pos)
+            buf, pos, eof = _fill(f, buf, pos)
+            continue
+        if end == len(buf) and not eof:
+            # A number or literal may continue in the next chunk
+            _check_record_size(len(buf) - pos)
+            buf, pos, eof = _fill(f, buf, pos)
+            continue
+        pos = end
+        expect_value = False
+        yield value
+
+
+def iter_ndjson(f):
+    while line := f.readline(MAX_RECORD_CHARS + 1):
+        _check_record_size(len(line.rstrip("\n")))
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_records(path: str, ext: str, objects_only: bool = True):
+    """Yield the records of a JSON array or NDJSON file (only dicts unless objects_only=False)."""
+    with open(path, "r", encoding="utf-8-sig") as f:
+        records = iter_ndjson(f) if ext in ("ndjson", "jsonl") else iter_json_array(f)
+        for record in records:
+            if objects_only and not isinstance(record, dict):
+                raise InvalidStructure("Invalid JSON structure for CSV conversion")
+            yield record
+
+
+def iter_csv_rows(path: str):
+    with open(path, "r", newline="", encoding="utf-8-sig") as f:
+        yield from csv.DictReader(f)
+
+
+def json_array_chunks(records):
+    """Same layout as json.dump(records, indent=4), produced row by row."""
+    parts = []
+    size = 0
+    first = True
+    for record in records:
+        body = json.dumps(record, indent=4).replace("\n", "\n    ")
+        part = ("[\n    " if first else ",\n    ") + body
+        first = False
+        parts.append(part)
+        size += len(part)
+        if size >= CHUNK_SIZE:
+            yield "".join(parts)
+            parts, size = [], 0
+    parts.append("[]" if first else "\n]")
+    yield "".join(parts)
+
+
+def ndjson_chunks(records):
+    parts = []
+    size = 0
+    for record in records:
+        line = json.dumps(record) + "\n"
+        parts.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield "".join(parts)
+            parts, size = [], 0
+    if parts:
+        yield "".join(parts)
+
+
+def _csv_value(value):
+    # Nested structures are kept as JSON instead of Python reprs
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def csv_chunks(path: str, ext: str):
+    """
+    Two streaming passes: the first collects the union of keys (in order of
+    first appearance) for the header, the second writes the rows.
+    """
+    headers = {}
+    for record in iter_records(path, ext):
+        for key in record:
+            headers.setdefault(key, None)
+    if not headers:
+        raise InvalidStructure("Invalid JSON structure for CSV conversion")
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(headers), restval="")
+    writer.writeheader()
+    for record in iter_records(path, ext):
+        writer.writerow({key: _csv_value(value) for key, value in record.items()})
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def conversion_chunks(input_path: str, original_ext: str, target_format: str):
+    """Text chunks of the converted file."""
+    if original_ext == "csv":
+        rows = iter_csv_rows(input_path)
+    elif target_format == "csv":
+        return csv_chunks(input_path, original_ext)
+    else:
+        rows = iter_records(input_path, original_ext, objects_only=False)
+
+    if target_format == "json":
+        return json_array_chunks(rows)
+    if target_format in ("ndjson", "jsonl"):
+        return ndjson_chunks(rows)
+    raise ValueError("Unsupported conversion")
+
+
+def prime(chunks):
+    """
+    Produce the first chunk eagerly so structural errors surface before a
+    response has started, then hand back an iterator over all chunks.
+    """
+    chunks = iter(chunks)
+    first = next(chunks, "")
+
+    def iterate():
+        yield first
+        yield from chunks
+
+    return iterate()
+
+
+def tee(chunks, output_path: str, target_format: str):
+    """Pass the chunks through while writing them to `output_path`."""
+    newline = "" if target_format == "csv" else None
+    with open(output_path, "w", newline=newline, encoding="utf-8") as out:
+        for chunk in chunks:
+            out.write(chunk)
+            yield chunk
+
+
+def convert_tabular(input_path: str, output_path: str, original_ext: str, target_format: str):
+    for _ in tee(conversion_chunks(input_path, original_ext, target_format), output_path, target_format):
+        pass
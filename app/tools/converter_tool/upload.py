@@ -0,0 +1,330 @@
+"""
+Streaming upload pipeline for the converter.
+
+The multipart body is parsed straight off the request stream instead of being
+spooled by FastAPI first. The first bytes of the file are sniffed to decide
+its real format (and therefore its size limit and conversion options), then
+the rest is hashed and written in the executor in 1 MB batches. Oversized or
+misnamed files are rejected as soon as that is known, before the whole body
+has landed on disk.
+"""
+import asyncio
+import codecs
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+
+try:
+    import python_multipart as multipart
+    from python_multipart.exceptions import ParseError
+    from python_multipart.multipart import parse_options_header
+except ModuleNotFoundError:
+    import multipart
+    from multipart.exceptions import ParseError
+    from multipart.multipart import parse_options_header
+
+from .engine import IMAGE_FORMATS
+from .tabular import TABULAR_FORMATS
+
+MB = 1024 * 1024
+WRITE_BATCH = MB
+SNIFF_BYTES = 512
+
+# Default per-category limits in MB, overridable with CONVERTER_UPLOAD_LIMITS="image=50,media=2048"
+DEFAULT_LIMITS_MB = {
+    "image": 50,
+    "tabular": 512,
+    "docx": 100,
+    "pdf": 200,
+    "media": 2048,
+}
+
+
+class UploadRejected(ValueError):
+    def __init__(self, message: str, status_code: int = 415):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class UploadTooLarge(UploadRejected):
+    def __init__(self, message: str):
+        super().__init__(message, status_code=413)
+
+
+@dataclass
+class UploadResult:
+    digest: str
+    ext: str
+    path: str
+    size: int
+    filename: str
+
+
+def parse_limits(value: str):
+    limits = {category: mb * MB for category, mb in DEFAULT_LIMITS_MB.items()}
+    for part in filter(None, (p.strip() for p in value.split(","))):
+        category, _, mb = part.partition("=")
+        limits[category.strip()] = int(mb) * MB
+    return limits
+
+
+UPLOAD_LIMITS = parse_limits(os.getenv("CONVERTER_UPLOAD_LIMITS", ""))
+
+
+def category_of(ext: str):
+    if ext in IMAGE_FORMATS:
+        return "image"
+    if ext in TABULAR_FORMATS:
+        return "tabular"
+    if ext in ("mp3", "mp4"):
+        return "media"
+    if ext in ("docx", "pdf"):
+        return ext
+    return None
+
+
+def _is_text(head: bytes) -> bool:
+    if b"\x00" in head:
+        return False
+    try:
+        # Incremental decode so a multi-byte character cut at the end is fine
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def sniff(head: bytes):
+    """Guess the format from magic bytes. Returns an extension, "zip", "text" or None."""
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[:2] == b"BM" and head[6:10] == b"\x00\x00\x00\x00":
+        return "bmp"
+    if head.startswith(b"%PDF-"):
+        return "pdf"
+    if head.startswith(b"PK\x03\x04"):
+        return "zip"
+    if head[4:8] == b"ftyp":
+        return "mp4"
+    if head.startswith(b"ID3") or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return "mp3"
+    if head and _is_text(head):
+        return "text"
+    return None
+
+
+def resolve_ext(declared: str, head: bytes) -> str:
+    """
+    Pick the extension used for storage and conversion options.
+    Images are relabelled to their real format; anything else whose content
+    does not match its extension is rejected.
+    """
+    if category_of(declared) is None:
+        raise UploadRejected(f"Unsupported file type: .{declared}")
+    if not head:
+        raise UploadRejected("Empty file", status_code=400)
+
+    detected = sniff(head)
+    if detected in IMAGE_FORMATS and declared in IMAGE_FORMATS:
+        return detected
+    if detected == "zip" and declared == "docx":
+        return declared
+    if detected == "text" and declared in TABULAR_FORMATS:
+        return declared
+    if detected == declared:
+        return declared
+    raise UploadRejected(f"File content does not match its .{declared} extension")
+
+
+def _write_batch(f, digest, data: bytes):
+    digest.update(data)
+    f.write(data)
+
+
+class _FileSink:
+    """Receives the bytes of the uploaded file part."""
+
+    def __init__(self, store, filename: str, limits: dict):
+        self.store = store
+        self.filename = filename
+        self.declared = filename.split('.')[-1].lower()
+        self.limits = limits
+        self.ext = None
+        self.limit = None
+        self.size = 0
+        self.pending = bytearray()
+        self.digest = hashlib.sha256()
+        self.tmp_path = os.path.join(store.root, f".upload-{uuid.uuid4()}.tmp")
+        self.file = None
+
+    async def feed(self, data: bytes):
+        self.size += len(data)
+        if self.limit is not None and self.size > self.limit:
+            raise UploadTooLarge(f"File exceeds the {self.limit // MB} MB limit for {category_of(self.ext)} files")
+        self.pending += data
+
+        if self.ext is None and len(self.pending) >= SNIFF_BYTES:
+            await self._sniff()
+        if self.ext is not None and len(self.pending) >= WRITE_BATCH:
+            await self._flush()
+
+    async def _sniff(self):
+        self.ext = resolve_ext(self.declared, bytes(self.pending[:SNIFF_BYTES]))
+        if category_of(self.ext) not in self.limits:
+            raise UploadRejected(f"{category_of(self.ext).capitalize()} files are not accepted here")
+        self.limit = self.limits[category_of(self.ext)]
+        if self.size > self.limit:
+            raise UploadTooLarge(f"File exceeds the {self.limit // MB} MB limit for {category_of(self.ext)} files")
+        loop = asyncio.get_running_loop()
+        self.file = await loop.run_in_executor(None, open, self.tmp_path, "wb")
+
+    async def _flush(self):
+        data, self.pending = bytes(self.pending), bytearray()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, _write_batch, self.file, self.digest, data)
+
+    async def finish(self) -> UploadResult:
+        if self.ext is None:
+            await self._sniff()
+        await self._flush()
+        loop = asyncio.get_running_loop()
+        digest, path = await loop.run_in_executor(None, self._commit)
+        return UploadResult(digest, self.ext, path, self.size, self.filename)
+
+    def _commit(self):
+        self.file.close()
+        return self.store.commit(self.tmp_path, self.digest.hexdigest(), self.ext)
+
+    def discard(self):
+        if self.file is not None:
+            self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+MAX_FIELD_BYTES = 64 * 1024
+
+
+async def receive_form(request, store, file_field: str = "file", max_files: int = 1, limits: dict = None,
+                       categories=None):
+    """
+    Parse a multipart request body as it arrives. Files sent under
+    `file_field` are stored (at most `max_files`); other parts are returned
+    as text fields. With `categories` (e.g. {"image"}) any other kind of
+    file is rejected as soon as it is sniffed. Returns (uploads, fields).
+    """
+    limits = limits or UPLOAD_LIMITS
+    if categories is not None:
+        limits = {category: limit for category, limit in limits.items() if category in categories}
+
+    content_length = request.headers.get("content-length")
+    max_body = max(limits.values()) * max_files + MB
+    if content_length and content_length.isdigit() and int(content_length) > max_body:
+        raise UploadTooLarge("Upload exceeds the maximum allowed size")
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadRejected("Expected a multipart/form-data upload", status_code=400)
+
+    # The parser is synchronous; callbacks queue events that are handled
+    # asynchronously after each chunk is fed in
+    events = []
+    part = {"headers": {}, "header": b""}
+
+    def on_part_begin():
+        part["headers"] = {}
+
+    def on_header_field(data, start, end):
+        part["header"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        key = part["header"].lower()
+        part["headers"][key] = part["headers"].get(key, b"") + data[start:end]
+
+    def on_header_end():
+        part["header"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        # Browsers send UTF-8 names, but nothing stops a client from sending other bytes
+        events.append((
+            "begin",
+            options.get(b"name", b"").decode("utf-8", errors="replace"),
+            options.get(b"filename", b"").decode("utf-8", errors="replace"),
+        ))
+
+    def on_part_data(data, start, end):
+        events.append(("data", data[start:end]))
+
+    def on_part_end():
+        events.append(("end",))
+
+    parser = multipart.MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    uploads = []
+    fields = {}
+    sink = None
+    field = None  # (name, bytearray) of the text part being read
+    try:
+        async for chunk in request.stream():
+            try:
+                parser.write(chunk)
+            except ParseError as e:
+                raise UploadRejected(f"Malformed multipart body: {e}", status_code=400)
+            for event in events:
+                if event[0] == "begin":
+                    name, filename = event[1], event[2]
+                    if filename:
+                        if name != file_field:
+                            continue
+                        if len(uploads) >= max_files:
+                            raise UploadRejected(f"At most {max_files} files per upload", status_code=400)
+                        sink = _FileSink(store, os.path.basename(filename), limits)
+                    else:
+                        field = (name, bytearray())
+                elif event[0] == "data":
+                    if sink is not None:
+                        await sink.feed(event[1])
+                    elif field is not None:
+                        field[1].extend(event[1])
+                        if len(field[1]) > MAX_FIELD_BYTES:
+                            raise UploadRejected(f"Form field '{field[0]}' is too large", status_code=400)
+                elif event[0] == "end":
+                    if sink is not None:
+                        uploads.append(await sink.finish())
+                        sink = None
+                    elif field is not None:
+                        fields[field[0]] = field[1].decode("utf-8", errors="replace")
+                        field = None
+            events.clear()
+        try:
+            parser.finalize()
+        except ParseError as e:
+            raise UploadRejected(f"Malformed multipart body: {e}", status_code=400)
+    except Exception:
+        if sink is not None:
+            await asyncio.get_running_loop().run_in_executor(None, sink.discard)
+        raise
+
+    if not uploads:
+        raise UploadRejected(f"Missing '{file_field}' file in upload", status_code=400)
+    return uploads, fields
+
+
+async def receive_upload(request, store, field_name: str = "file", limits: dict = None) -> UploadResult:
+    """Parse a multipart request body as it arrives and store the `field_name` file."""
+    uploads, _ = await receive_form(request, store, file_field=field_name, limits=limits)
+    return uploads[0]
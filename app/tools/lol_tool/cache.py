@@ -0,0 +1,111 @@
+"""
+In-memory cache of scraped champion builds.
+
+Entries are keyed by (champion slug, patch version). A build is fresh for
+`ttl` seconds; for `stale_ttl` seconds after that it is still served
+straight away while a single background refresh re-scrapes it. The cache is
+an LRU bounded to `max_entries` builds, and concurrent misses for the same
+champion share one scrape.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BuildCache:
+    def __init__(self, scrape: Callable[[str], Awaitable[Optional[dict]]],
+                 ttl: float = 1800, stale_ttl: float = 21600, max_entries: int = 256):
+        self.scrape = scrape
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (slug, version) -> (fetched_at, data)
+        self._in_flight = {}  # (slug, version) -> asyncio.Task
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    @classmethod
+    def from_env(cls, scrape):
+        return cls(
+            scrape,
+            ttl=float(os.getenv("LOL_BUILD_TTL", "1800")),
+            stale_ttl=float(os.getenv("LOL_BUILD_STALE_TTL", "21600")),
+            max_entries=int(os.getenv("LOL_BUILD_CACHE_SIZE", "256")),
+        )
+
+    async def get(self, slug: str, version: str) -> Optional[dict]:
+        """Build for `slug` on patch `version`; None if it could not be scraped."""
+        key = (slug, version)
+        entry = self._entries.get(key)
+        if entry is not None:
+            fetched_at, data = entry
+            age = time.monotonic() - fetched_at
+            if age < self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return data
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._entries.move_to_end(key)
+                if key not in self._in_flight:
+                    self.refreshes += 1
+                    self._load(key)
+                return data
+            del self._entries[key]
+
+        self.misses += 1
+        # shield: one caller disconnecting must not cancel the others' scrape
+        return await asyncio.shield(self._load(key))
+
+    def is_fresh(self, slug: str, version: str) -> bool:
+        entry = self._entries.get((slug, version))
+        return entry is not None and time.monotonic() - entry[0] < self.ttl
+
+    async def load(self, slug: str, version: str) -> Optional[dict]:
+        """Scrape and store a build (joining a scrape in flight) without touching the counters."""
+        return await asyncio.shield(self._load((slug, version)))
+
+    def _load(self, key) -> asyncio.Task:
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._scrape(key))
+            self._in_flight[key] = task
+        return task
+
+    async def _scrape(self, key) -> Optional[dict]:
+        try:
+            data = await self.scrape(key[0])
+            if data is not None:
+                self.put(key[0], key[1], data)
+            elif key in self._entries:
+                logger.error(f"Refreshing {key[0]} failed; keeping the stale build")
+            return data
+        finally:
+            self._in_flight.pop(key, None)
+
+    def put(self, slug: str, version: str, data: dict):
+        key = (slug, version)
+        self._entries[key] = (time.monotonic(), data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "stale_seconds": self.stale_ttl,
+            "in_flight": len(self._in_flight),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+        }
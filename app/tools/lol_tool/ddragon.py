@@ -0,0 +1,247 @@
+"""
+Data Dragon static data, kept per patch.
+
+The current version, the rune id -> icon map, the champion list and each
+champion's spell images only change when a new patch is published, so they are cached in
+memory and persisted to a JSON snapshot that survives restarts. The version
+list is re-checked at most every `check_interval` seconds; runes and spells
+are only re-fetched when it reports a new version. Concurrent searches that
+need the same missing data share a single fetch.
+
+The snapshot is written in a thread through a unique temp file (several
+workers may share it): right away for a new patch, otherwise once spell
+data has stopped changing for SAVE_DELAY seconds, so a prefetch of every
+champion ends in one write instead of one per champion.
+"""
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from .index import ChampionIndex, champion_slug
+
+logger = logging.getLogger(__name__)
+
+DDRAGON = "https://ddragon.leagueoflegends.com"
+# Where the JSON is fetched from; icon URLs handed to browsers always use DDRAGON.
+# Overridable to point at a local stand-in (see lol_fixtures.py)
+DDRAGON_API = os.getenv("LOL_DDRAGON_BASE", DDRAGON).rstrip("/")
+FALLBACK_VERSION = "14.23.1"
+REQUEST_TIMEOUT = 10
+# Retry sooner when Data Dragon could not be reached
+RETRY_INTERVAL = 60
+# Quiet period before newly fetched spells are written to the snapshot
+SAVE_DELAY = 30
+
+# Stat shards are not part of runesReforged.json
+SHARD_ICONS = {
+    "5008": "StatModsAdaptiveForceIcon.png",
+    "5005": "StatModsAttackSpeedIcon.png",
+    "5002": "StatModsArmorIcon.png",
+    "5003": "StatModsMagicResIcon.png",
+    "5001": "StatModsHealthScalingIcon.png",
+    "5007": "StatModsCDRScalingIcon.png",
+}
+
+
+def guess_champion_key(slug: str) -> str:
+    """DDragon key for a slug when the champion list is unavailable; most are just capitalized."""
+    if slug == "wukong": return "MonkeyKing"
+    if slug == "kogmaw": return "KogMaw"
+    if slug == "reksai": return "RekSai"
+    return slug.capitalize()
+
+
+class StaticData:
+    def __init__(self, snapshot_path: Optional[str] = None, check_interval: float = 600):
+        self.snapshot_path = snapshot_path
+        self.check_interval = check_interval
+        self.version = FALLBACK_VERSION
+        self.runes = {}  # rune id -> icon path under /cdn/img/
+        self.champions = {}  # DDragon champion key -> display name
+        self.index = ChampionIndex({})
+        self.spells = {}  # DDragon champion key -> [Q, W, E, R] image file names
+        self.upstream_requests = 0
+        self._next_check = 0.0
+        self._in_flight = {}  # "versions" or champion key -> asyncio.Task
+        self._dirty = False
+        self._save_at = 0.0
+        self._save_task = None
+        self._save_lock = asyncio.Lock()
+        self._load_snapshot()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            snapshot_path=os.getenv("LOL_DDRAGON_SNAPSHOT", "app/static/lol/ddragon.json") or None,
+            check_interval=float(os.getenv("LOL_DDRAGON_CHECK_INTERVAL", "600")),
+        )
+
+    def _load_snapshot(self):
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+            self.version = snapshot["version"]
+            self.runes = snapshot["runes"]
+            self.champions = snapshot.get("champions", {})
+            self.index = ChampionIndex(self.champions)
+            self.spells = snapshot.get("spells", {})
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Ignoring unreadable DDragon snapshot: {e}")
+
+    async def save_snapshot(self):
+        """Write the snapshot now (in a thread); pending debounced changes are included."""
+        self._dirty = False
+        if not self.snapshot_path:
+            return
+        # Copied on the loop; the thread never sees the live dicts change
+        snapshot = {"version": self.version, "runes": dict(self.runes), "champions": dict(self.champions),
+                    "spells": dict(self.spells)}
+        async with self._save_lock:
+            try:
+                await asyncio.to_thread(self._write_snapshot, snapshot)
+            except OSError as e:
+                logger.error(f"Failed to save DDragon snapshot: {e}")
+
+    def _write_snapshot(self, snapshot: dict):
+        directory = os.path.dirname(self.snapshot_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(self.snapshot_path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(snapshot, f)
+            os.replace(temp_path, self.snapshot_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def _save_soon(self):
+        """Debounced save: SAVE_DELAY seconds after the last change."""
+        self._dirty = True
+        self._save_at = time.monotonic() + SAVE_DELAY
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._save_later())
+
+    async def _save_later(self):
+        while self._dirty and time.monotonic() < self._save_at:
+            await asyncio.sleep(self._save_at - time.monotonic())
+        if self._dirty:
+            await self.save_snapshot()
+
+    async def _get_json(self, client: httpx.AsyncClient, path: str):
+        self.upstream_requests += 1
+        response = await client.get(f"{DDRAGON_API}{path}", timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    async def _shared(self, name: str, fetch):
+        task = self._in_flight.get(name)
+        if task is None:
+            task = asyncio.create_task(fetch())
+            self._in_flight[name] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(name, None))
+        # shield: one search being cancelled must not cancel the others' fetch
+        return await asyncio.shield(task)
+
+    async def refresh(self, client: httpx.AsyncClient, force: bool = False) -> str:
+        """Current patch version; fetches new rune data when the patch changed."""
+        if not force and time.monotonic() < self._next_check:
+            return self.version
+        return await self._shared("versions", lambda: self._check_version(client))
+
+    async def _check_version(self, client: httpx.AsyncClient) -> str:
+        try:
+            latest = (await self._get_json(client, "/api/versions.json"))[0]
+            if latest != self.version or not self.runes or not self.champions:
+                logger.info(f"DDragon patch {self.version} -> {latest}")
+                self.runes, self.champions = await asyncio.gather(
+                    self._fetch_runes(client, latest),
+                    self._fetch_champions(client, latest),
+                )
+                self.index = ChampionIndex(self.champions)
+                self.spells = {}
+                self.version = latest
+                await self.save_snapshot()
+            self._next_check = time.monotonic() + self.check_interval
+        except Exception as e:
+            logger.error(f"Failed to refresh DDragon data: {e}")
+            self._next_check = time.monotonic() + min(RETRY_INTERVAL, self.check_interval)
+        return self.version
+
+    async def _fetch_runes(self, client: httpx.AsyncClient, version: str) -> Dict[str, str]:
+        runes = {}
+        for tree in await self._get_json(client, f"/cdn/{version}/data/en_US/runesReforged.json"):
+            for slot in tree['slots']:
+                for rune in slot['runes']:
+                    runes[str(rune['id'])] = rune['icon']
+        return runes
+
+    async def _fetch_champions(self, client: httpx.AsyncClient, version: str) -> Dict[str, str]:
+        champions = await self._get_json(client, f"/cdn/{version}/data/en_US/champion.json")
+        return {key: champion['name'] for key, champion in champions['data'].items()}
+
+    def champion_slug(self, name: str) -> str:
+        """LeagueOfGraphs slug for any name, key or alias of a champion."""
+        champion = self.index.resolve(name)
+        return champion.slug if champion else champion_slug(name)
+
+    def champion_key(self, name: str) -> str:
+        """DDragon key for any name, key, alias or slug of a champion."""
+        champion = self.index.resolve(name)
+        return champion.key if champion else guess_champion_key(champion_slug(name))
+
+    def champion_icon(self, key: str) -> str:
+        return f"{DDRAGON}/cdn/{self.version}/img/champion/{key}.png"
+
+    def rune_icon(self, rune_id: Optional[str]) -> str:
+        if not rune_id:
+            return ""
+        if rune_id in self.runes:
+            return f"{DDRAGON}/cdn/img/{self.runes[rune_id]}"
+        if rune_id in SHARD_ICONS:
+            return f"{DDRAGON}/cdn/img/perk-images/StatMods/{SHARD_ICONS[rune_id]}"
+        return f"{DDRAGON}/cdn/img/perk-images/StatMods/StatMods{rune_id}Icon.png"
+
+    async def spell_images(self, client: httpx.AsyncClient, champion_key: str) -> List[str]:
+        """[Q, W, E, R] image file names for a DDragon champion key, fetched once per patch."""
+        images = self.spells.get(champion_key)
+        if images is not None:
+            return images
+        return await self._shared(champion_key, lambda: self._fetch_spells(client, champion_key))
+
+    async def _fetch_spells(self, client: httpx.AsyncClient, champion_key: str) -> List[str]:
+        version = self.version
+        champion = await self._get_json(client, f"/cdn/{version}/data/en_US/champion/{champion_key}.json")
+        images = [spell['image']['full'] for spell in champion['data'][champion_key]['spells']]
+        if version == self.version:
+            self.spells[champion_key] = images
+            self._save_soon()
+        return images
+
+    async def prepare(self, client: httpx.AsyncClient, champion_key: str):
+        """Make sure the patch data a search for `champion_key` needs is loaded. Never raises."""
+        await self.refresh(client)
+        try:
+            await self.spell_images(client, champion_key)
+        except Exception as e:
+            logger.error(f"Failed to fetch spell images for {champion_key}: {e}")
+
+    def spell_icon(self, image: str) -> str:
+        return f"{DDRAGON}/cdn/{self.version}/img/spell/{image}"
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "runes": len(self.runes),
+            "champions": len(self.champions),
+            "spells": len(self.spells),
+            "upstream_requests": self.upstream_requests,
+            "snapshot": self.snapshot_path,
+        }
@@ -0,0 +1,99 @@
+"""
+Champion name index built from Data Dragon's champion list.
+
+Every champion is reachable by its display name, DDragon key, LeagueOfGraphs
+slug and a few common aliases, all normalized (lowercase, letters and digits
+only), through a dict for exact lookups. Autocomplete uses a sorted array of
+those terms plus each word of the name ("willump", "glasc"), so a prefix
+query is a binary search followed by a short scan.
+"""
+import re
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+NON_ALNUM = re.compile(r"[^a-z0-9]")
+
+# Nicknames players actually type -> DDragon key
+ALIASES = {
+    "mf": "MissFortune",
+    "tf": "TwistedFate",
+    "asol": "AurelionSol",
+    "j4": "JarvanIV",
+    "jarvan": "JarvanIV",
+    "xin": "XinZhao",
+    "lb": "Leblanc",
+    "mundo": "DrMundo",
+    "kog": "KogMaw",
+    "cait": "Caitlyn",
+    "heimer": "Heimerdinger",
+    "morde": "Mordekaiser",
+    "tk": "TahmKench",
+    "ww": "Warwick",
+    "yi": "MasterYi",
+}
+
+
+def normalize(name: str) -> str:
+    return NON_ALNUM.sub("", name.lower())
+
+
+def champion_slug(champion_name: str) -> str:
+    """LeagueOfGraphs URL name, e.g. "Kog'Maw" -> "kogmaw"."""
+    champion_name = champion_name.lower().replace(" ", "").replace("'", "").replace(".", "")
+    # Nunu & Willump -> nunu
+    if champion_name == "nunu&willump": champion_name = "nunu"
+    if champion_name == "renata" or champion_name == "renataglasc": champion_name = "renata"
+    return champion_name
+
+
+@dataclass(frozen=True)
+class Champion:
+    key: str  # DDragon id, e.g. "MonkeyKing"
+    name: str  # display name, e.g. "Wukong"
+    slug: str  # LeagueOfGraphs URL name, e.g. "wukong"
+
+
+class ChampionIndex:
+    def __init__(self, champions: Dict[str, str]):
+        """`champions` maps DDragon key -> display name (StaticData.champions)."""
+        self.by_term = {}  # normalized name / key / slug / alias -> Champion
+        terms = set()
+        for key, name in champions.items():
+            champion = Champion(key=key, name=name, slug=champion_slug(name))
+            for term in (normalize(name), normalize(key), champion.slug):
+                self.by_term[term] = champion
+                terms.add((term, key))
+            for word in name.split():
+                if normalize(word):
+                    terms.add((normalize(word), key))
+        for alias, key in ALIASES.items():
+            if key in champions:
+                self.by_term[alias] = self.by_term[normalize(key)]
+                terms.add((alias, key))
+        self.by_key = {champion.key: champion for champion in self.by_term.values()}
+        self._terms = sorted(terms)
+
+    def __len__(self):
+        return len(self.by_key)
+
+    def resolve(self, name: str) -> Optional[Champion]:
+        return self.by_term.get(normalize(name))
+
+    def complete(self, prefix: str, limit: int = 8) -> List[Champion]:
+        """Champions with a name, key, word or alias starting with `prefix`, best match first."""
+        query = normalize(prefix)
+        if not query:
+            return []
+        exact = self.by_term.get(query)
+        matches = [exact] if exact else []
+        position = bisect_left(self._terms, (query, ""))
+        while position < len(self._terms) and len(matches) < limit:
+            term, key = self._terms[position]
+            if not term.startswith(query):
+                break
+            champion = self.by_key[key]
+            if champion not in matches:
+                matches.append(champion)
+            position += 1
+        return matches
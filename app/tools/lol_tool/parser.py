@@ -0,0 +1,189 @@
+"""
+Single-pass extraction of a LeagueOfGraphs build page.
+
+The page is parsed with lxml's C parser and its elements are walked once in
+document order. The walk remembers the latest h2/h3/h4 as the current
+section, so each item row knows its category without searching backwards,
+and the "Skill Order" / "Counters" / "Is countered by" containers are taken
+as the first <div> after their header instead of rescanning the document
+for each one. Only the matched subtrees (a row, a rune table, a section
+container) are read again.
+"""
+import logging
+
+import lxml.html
+
+from .ddragon import DDRAGON, StaticData
+
+logger = logging.getLogger(__name__)
+
+HEADER_TAGS = {"h2", "h3", "h4"}
+# Section header text -> what its first following <div> contains
+SECTIONS = {"Skill Order": "skills", "Counters": "good", "Is countered by": "bad"}
+ITEM_LIMITS = {"starting": 3, "core": 3, "final": 3, "boots": 1}
+MATCHUP_LIMIT = 5
+SKILL_KEYS = ("Q", "W", "E", "R")
+
+# LoG display name (spaces and punctuation removed) -> DDragon key
+DDRAGON_NAMES = {
+    "Wukong": "MonkeyKing",
+    "RenataGlasc": "Renata",
+    "Nunu&Willump": "Nunu",
+}
+
+
+def format_champion_name_for_ddragon(name: str) -> str:
+    clean_name = name.replace(" ", "").replace("'", "").replace(".", "")
+    return DDRAGON_NAMES.get(clean_name, clean_name)
+
+
+def has_class(element, name: str) -> bool:
+    return name in (element.get("class") or "").split()
+
+
+def item_category(header_text: str):
+    text = header_text.strip().lower()
+    if "starting" in text:
+        return "starting"
+    if "core" in text:
+        return "core"
+    if "end game" in text or "final" in text:
+        return "final"
+    if "boots" in text:
+        return "boots"
+    return None
+
+
+def tooltip_images(element):
+    return [img for img in element.iter("img") if has_class(img, "requireTooltip")]
+
+
+def opacity(element) -> float:
+    style = element.get("style") or ""
+    if "opacity" in style:
+        try:
+            return float(style.split("opacity:")[1].split(";")[0].strip())
+        except (IndexError, ValueError):
+            pass
+    return 1.0
+
+
+def rune_id(img):
+    """8112 from class="requireTooltip perk-8112-48"."""
+    for cls in (img.get("class") or "").split():
+        if cls.startswith("perk-"):
+            parts = cls.split("-")
+            if len(parts) >= 2:
+                return parts[1]
+    return None
+
+
+def parse_build(champion_name: str, html: bytes, static: StaticData) -> dict:
+    """Champion data from a LeagueOfGraphs build page (`champion_name` is the slug)."""
+    root = lxml.html.document_fromstring(html)
+    version = static.version
+
+    items = {"starting": [], "core": [], "final": [], "boots": []}
+    runes = []
+    containers = {}  # "skills" / "good" / "bad" -> element
+    pending = []  # sections whose header was seen but not their <div> yet
+    found_headers = set()
+    category = None
+
+    for element in root.iter():
+        tag = element.tag
+        if not isinstance(tag, str):
+            # Comments and processing instructions
+            continue
+        if tag in HEADER_TAGS:
+            text = element.text_content()
+            category = item_category(text)
+            for header_text, section in SECTIONS.items():
+                if header_text in text and header_text not in found_headers:
+                    found_headers.add(header_text)
+                    pending.append(section)
+        elif tag == "div":
+            if pending:
+                for section in pending:
+                    containers[section] = element
+                pending = []
+            if category and has_class(element, "iconsRow"):
+                add_items(items, category, tooltip_images(element), version)
+        if has_class(element, "perksTableOverview"):
+            for img in tooltip_images(element):
+                if opacity(img.getparent()) > 0.5:
+                    rid = rune_id(img)
+                    runes.append({"name": img.get("alt", "Unknown"), "icon": static.rune_icon(rid), "id": rid})
+
+    data = {
+        "name": champion_name,
+        "icon": f"{DDRAGON}/cdn/img/champion/tiles/{champion_name.capitalize()}_0.jpg",
+        "items": items,
+        "runes": {"primary": [], "secondary": []},
+        "skills": [],
+        "matchups": {"good": [], "bad": []},
+    }
+
+    # Primary (4), secondary (2), then stat shards (3)
+    if len(runes) >= 4:
+        data["runes"]["primary"] = runes[:4]
+    if len(runes) >= 6:
+        data["runes"]["secondary"] = runes[4:6]
+    if len(runes) >= 9:
+        data["runes"]["stats"] = runes[6:9]
+
+    if "skills" in containers:
+        spell_map = dict(zip(SKILL_KEYS, static.spells.get(static.champion_key(champion_name), [])))
+        keys = [spell.text_content().strip() for spell in containers["skills"].iter() if has_class(spell, "championSpell")]
+        data["skills"] = [
+            {"key": key, "icon": static.spell_icon(spell_map[key]) if key in spell_map else ""}
+            for key in keys if key in SKILL_KEYS
+        ][:4]
+
+    for side in ("good", "bad"):
+        if side in containers:
+            data["matchups"][side] = matchups(containers[side], static)
+
+    logger.info(f"Parsed {champion_name}: {sum(len(v) for v in items.values())} items, {len(runes)} runes")
+    return data
+
+
+def add_items(items: dict, category: str, imgs, version: str):
+    # With 4+ core items the first one is an early component; list it separately
+    if category == "core" and len(imgs) >= 4:
+        item = item_entry(imgs[0], version)
+        if item:
+            items.setdefault("early", []).append(item)
+        imgs = imgs[1:]
+
+    seen = set()
+    for img in imgs:
+        item = item_entry(img, version)
+        if item and item["name"] not in seen:
+            seen.add(item["name"])
+            items[category].append(item)
+            if len(items[category]) >= ITEM_LIMITS[category]:
+                break
+
+
+def item_entry(img, version: str):
+    tooltip_var = img.get("tooltip-var", "")
+    alt_text = img.get("alt", "")
+    if "item-" not in tooltip_var or not alt_text:
+        return None
+    item_id = tooltip_var.replace("item-", "")
+    return {"name": alt_text, "icon": f"{DDRAGON}/cdn/{version}/img/item/{item_id}.png"}
+
+
+def matchups(container, static: StaticData):
+    champs = []
+    for img in container.iter("img"):
+        alt = img.get("alt")
+        if alt:
+            name = alt.strip()
+            champion = static.index.resolve(name)
+            key = champion.key if champion else format_champion_name_for_ddragon(name)
+            champs.append({"name": name, "icon": static.champion_icon(key)})
+            if len(champs) >= MATCHUP_LIMIT:
+                break
+    return champs
@@ -0,0 +1,156 @@
+"""
+Background pre-warming of champion builds after a patch.
+
+Once started, the prefetcher checks the Data Dragon version every
+`interval` seconds. For every version it has not warmed yet (including the
+current one after a restart, since the build cache lives in memory), it
+lists all champions from champion.json and scrapes the builds that are not
+already fresh into the BuildCache. At most `concurrency` scrapes run at once
+and new ones start no faster than `rate` per second (0 disables the pacing),
+so a new patch does not turn into a burst against LeagueOfGraphs.
+
+The loop runs for the app's lifetime (started and cancelled through the
+tool registry). With several worker processes only the one holding the lock
+file prefetches, so the upstream load stays bounded; the others stand by and
+take over if it exits. Only that worker's cache is warmed.
+
+User searches never queue behind it: they go to the cache directly, and a
+search for a champion that is being prefetched joins that scrape.
+"""
+import asyncio
+import logging
+import os
+import time
+
+try:
+    import fcntl
+except ModuleNotFoundError:
+    # No flock (Windows): every process prefetches
+    fcntl = None
+
+import httpx
+
+from .cache import BuildCache
+from .ddragon import StaticData
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    def __init__(self, client: httpx.AsyncClient, static: StaticData, cache: BuildCache, slug_for,
+                 enabled: bool = True, concurrency: int = 2, rate: float = 0.5, interval: float = 600,
+                 lock_path: str = None):
+        self.client = client
+        self.static = static
+        self.cache = cache
+        self.slug_for = slug_for  # display name -> LeagueOfGraphs slug
+        self.enabled = enabled
+        self.concurrency = concurrency
+        self.rate = rate
+        self.interval = interval
+        self.lock_path = lock_path
+        self.version = None  # last version fully prefetched
+        self.progress = {"status": "idle", "version": None, "total": 0, "done": 0, "cached": 0,
+                         "failed": 0, "started_at": None, "finished_at": None}
+        self.running = False
+        self._lock_file = None
+
+    @classmethod
+    def from_env(cls, client, static, cache, slug_for):
+        return cls(
+            client, static, cache, slug_for,
+            enabled=os.getenv("LOL_PREFETCH", "1") == "1",
+            concurrency=max(int(os.getenv("LOL_PREFETCH_CONCURRENCY", "2")), 1),
+            rate=max(float(os.getenv("LOL_PREFETCH_RATE", "0.5")), 0.0),
+            interval=float(os.getenv("LOL_PREFETCH_INTERVAL", "600")),
+            lock_path=os.getenv("LOL_PREFETCH_LOCK", "app/static/lol/.prefetch.lock") or None,
+        )
+
+    def _claim(self) -> bool:
+        """Whether this process is the one that prefetches. The flock goes away with the process."""
+        if self._lock_file is not None or fcntl is None or not self.lock_path:
+            return True
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _unclaim(self):
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    async def run(self):
+        if not self.enabled:
+            return
+        self.running = True
+        try:
+            while True:
+                try:
+                    if self._claim():
+                        version = await self.static.refresh(self.client)
+                        if version != self.version and self.static.champions:
+                            await self.prefetch(version)
+                    else:
+                        self.progress["status"] = "standby"
+                except Exception as e:
+                    logger.error(f"Build prefetch failed: {e}")
+                await asyncio.sleep(self.interval)
+        finally:
+            self.running = False
+            self._unclaim()
+
+    async def prefetch(self, version: str):
+        slugs = sorted({self.slug_for(name) for name in self.static.champions.values()})
+        self.progress = {"status": "running", "version": version, "total": len(slugs), "done": 0, "cached": 0,
+                         "failed": 0, "started_at": time.time(), "finished_at": None}
+        logger.info(f"Prefetching {len(slugs)} champion builds for patch {version}")
+
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = []
+        try:
+            for slug in slugs:
+                if self.cache.is_fresh(slug, version):
+                    self.progress["cached"] += 1
+                    self.progress["done"] += 1
+                    continue
+                await slots.acquire()
+                tasks.append(asyncio.create_task(self._warm(slug, version, slots)))
+                if self.rate > 0:
+                    await asyncio.sleep(1 / self.rate)
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Spell data of every champion, written once
+            await self.static.save_snapshot()
+        except BaseException:
+            # Cancelled at shutdown: the scrapes already started finish into the cache
+            self.progress.update(status="aborted", finished_at=time.time())
+            raise
+
+        self.progress.update(status="done", finished_at=time.time())
+        self.version = version
+
+    async def _warm(self, slug: str, version: str, slots: asyncio.Semaphore):
+        try:
+            if await self.cache.load(slug, version) is None:
+                self.progress["failed"] += 1
+        except Exception as e:
+            logger.error(f"Prefetching {slug} failed: {e}")
+            self.progress["failed"] += 1
+        finally:
+            self.progress["done"] += 1
+            slots.release()
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "leader": self._lock_file is not None or fcntl is None or not self.lock_path,
+            "concurrency": self.concurrency,
+            "rate_per_second": self.rate,
+            **self.progress,
+        }
@@ -1,11 +1,35 @@
+import asyncio
+import os
+from typing import List
 from fastapi import APIRouter, Request, Query
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import JSONResponse
-from .scraper import scrape_champion
+from functools import partial
+from .scraper import scrape_champion_async, make_client, ddragon
+from .index import champion_slug
+from .cache import BuildCache
+from .prefetch import Prefetcher
+
+# One keep-alive connection pool for every search
+http_client = make_client()
+build_cache = BuildCache.from_env(partial(scrape_champion_async, http_client))
+prefetcher = Prefetcher.from_env(http_client, ddragon, build_cache, champion_slug)
+
+BATCH_MAX_CHAMPIONS = int(os.getenv("LOL_BATCH_MAX_CHAMPIONS", "10"))
+# Whole-batch latency budget; slower champions are reported as errors
+BATCH_TIMEOUT = float(os.getenv("LOL_BATCH_TIMEOUT", "8"))
+
+async def run_prefetcher():
+    """Background task run by the tool registry for the app's lifetime."""
+    await prefetcher.run()
+
+async def shutdown():
+    """Called by the tool registry at app shutdown, once the prefetcher is cancelled."""
+    await http_client.aclose()
 
 router = APIRouter(
     prefix="/tools/lol",
-    tags=["lol"]
+    tags=["lol"],
 )
 
 templates = Jinja2Templates(directory=["app/templates", "app/tools/lol_tool/templates"])
@@ -16,10 +40,11 @@ def lol_dashboard(request: Request):
     return templates.TemplateResponse("lol_dashboard.html", {"request": request})
 
 @router.get("/search")
-def search_champion(champion: str = Query(...)):
+async def search_champion(champion: str = Query(...)):
     """Search for champion data."""
     try:
-        data = scrape_champion(champion)
+        version = await ddragon.refresh(http_client)
+        data = await build_cache.get(ddragon.champion_slug(champion), version)
         if not data:
             return JSONResponse(content={"error": "Champion not found or data unavailable"}, status_code=404)
         return JSONResponse(content=data)
@@ -27,3 +52,55 @@ def search_champion(champion: str = Query(...)):
         import traceback
         traceback.print_exc()
         return JSONResponse(content={"error": f"Internal Server Error: {str(e)}"}, status_code=500)
+
+@router.get("/batch")
+async def search_champions(champions: List[str] = Query(...)):
+    """
+    Look up several champions at once (?champions=ahri&champions=zed or
+    ?champions=ahri,zed). Repeated names are looked up once; whatever
+    resolves within the time budget is returned, the rest is in `errors`.
+    """
+    names = [name.strip() for value in champions for name in value.split(",") if name.strip()]
+    slugs = list(dict.fromkeys(ddragon.champion_slug(name) for name in names))
+    if not slugs:
+        return JSONResponse(content={"error": "No champions given"}, status_code=400)
+    if len(slugs) > BATCH_MAX_CHAMPIONS:
+        return JSONResponse(content={"error": f"At most {BATCH_MAX_CHAMPIONS} champions per batch"}, status_code=400)
+
+    version = await ddragon.refresh(http_client)
+    tasks = {slug: asyncio.create_task(build_cache.get(slug, version)) for slug in slugs}
+    done, pending = await asyncio.wait(tasks.values(), timeout=BATCH_TIMEOUT)
+    for task in pending:
+        # Only stops waiting; the scrape itself finishes and lands in the cache
+        task.cancel()
+
+    results, errors = {}, {}
+    for slug, task in tasks.items():
+        if task in pending:
+            errors[slug] = "Timed out"
+        elif task.exception() is not None:
+            errors[slug] = f"Internal Server Error: {task.exception()}"
+        elif task.result() is None:
+            errors[slug] = "Champion not found or data unavailable"
+        else:
+            results[slug] = task.result()
+    return {"results": results, "errors": errors}
+
+@router.get("/champions")
+async def complete_champion(q: str = Query(""), limit: int = Query(8, ge=1, le=50)):
+    """Autocomplete: champions whose name, key, word or alias starts with `q`."""
+    await ddragon.refresh(http_client)
+    return [
+        {"name": champion.name, "key": champion.key, "slug": champion.slug, "icon": ddragon.champion_icon(champion.key)}
+        for champion in ddragon.index.complete(q, limit)
+    ]
+
+@router.get("/stats")
+def lol_stats():
+    """Cached Data Dragon patch data and build cache counters."""
+    return {"ddragon": ddragon.stats(), "builds": build_cache.stats(), "prefetch": prefetcher.stats()}
+
+@router.get("/prefetch")
+def prefetch_progress():
+    """Progress of warming every champion's build for the current patch."""
+    return prefetcher.stats()
@@ -0,0 +1,36 @@
+"""
+On-disk cache of finished YouTube downloads.
+
+Entries are keyed by (video, type, yt-dlp format string), so the same video
+requested at the same quality is downloaded and merged once and then served
+from disk (see app/filecache.py for eviction). The retention service sweeps
+it under the "downloads" policy (age limit and shared quota).
+"""
+import hashlib
+import json
+import os
+
+from ...filecache import FileCache
+
+
+def download_key(url: str, type: str, format: str) -> str:
+    """`url` should already be canonical (see metadata.canonical_url)."""
+    raw = json.dumps([url, type, format])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class DownloadCache(FileCache):
+    def temp_prefix(self) -> str:
+        """Path prefix for a download in progress (hidden from the index)."""
+        return self.temp_path()
+
+    def discard_temp(self, prefix: str):
+        """Remove whatever a failed download left behind (.part files, unmerged streams)."""
+        directory, name = os.path.split(prefix)
+        for entry in os.listdir(directory):
+            if entry.startswith(name):
+                self._remove(os.path.join(directory, entry))
+
+    def put(self, key: str, src_path: str) -> str:
+        """Move a finished download into the cache and return its cached path."""
+        return self._put(key, src_path, os.path.join(self.root, key + os.path.splitext(src_path)[1]))
@@ -0,0 +1,344 @@
+"""
+Background download jobs for the YouTube tool.
+
+A download is submitted as a job and runs on a bounded thread pool (yt-dlp
+and the ffmpeg merge are blocking). Progress comes from yt-dlp's
+progress_hooks and postprocessor_hooks and is relayed to the event loop, where
+clients follow it by polling or over SSE and fetch the file once it is done.
+The number of queued + running jobs is capped by the queue depth, so a burst of
+requests gets 429s instead of saturating bandwidth and CPU; streams relayed
+by /stream (see stream.py) hold a queue slot too. Finished files go
+to the DownloadCache; a repeated request is answered from disk or joins the
+download already running.
+
+Downloads start from the info dict cached by the MetadataService (usually
+already extracted by /info), and the format is chosen up front from its
+format list, so the video is not extracted again for the download or for a
+format fallback.
+"""
+import asyncio
+import copy
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+import yt_dlp
+from yt_dlp.postprocessor import FFmpegMergerPP
+from yt_dlp.utils import YoutubeDLError
+
+from ...jobqueue import BaseJob, JobQueue
+from .cache import DownloadCache, download_key
+from .metadata import MetadataService, canonical_url
+
+# Minimum interval between two progress updates of the same job
+PROGRESS_INTERVAL = 0.5
+
+# Fragments (DASH/HLS) fetched in parallel within one download
+FRAGMENT_CONCURRENCY = int(os.getenv("YOUTUBE_FRAGMENT_CONCURRENCY", "4"))
+
+VIDEO_FORMATS = {
+    'best': 'bestvideo[ext=mp4][vcodec^=avc]+bestaudio[ext=m4a]/best[ext=mp4]/best',
+    '1080p': 'bestvideo[height<=1080][ext=mp4][vcodec^=avc]+bestaudio[ext=m4a]/best[height<=1080][ext=mp4]/best',
+    '720p': 'bestvideo[height<=720][ext=mp4][vcodec^=avc]+bestaudio[ext=m4a]/best[height<=720][ext=mp4]/best',
+    '480p': 'bestvideo[height<=480][ext=mp4][vcodec^=avc]+bestaudio[ext=m4a]/best[height<=480][ext=mp4]/best',
+    # Single file with audio and video: no merge, so it can be streamed through
+    'progressive': 'best[ext=mp4][vcodec!=none][acodec!=none]/best[ext=mp4]/best',
+}
+# Used when the preferred H.264/AAC selection matches nothing
+FALLBACK_FORMAT = 'bestvideo+bestaudio/best'
+# Last resort when separate streams cannot be merged (no ffmpeg)
+SINGLE_FILE_FORMAT = 'best'
+
+
+def download_filename(title: Optional[str], ext: str, fallback: str) -> str:
+    """Name offered to the browser: the sanitised title plus `ext` (".mp4"), else `fallback`."""
+    if title:
+        safe_title = "".join(c for c in title if c not in '\\/*?:"<>|').strip()
+        if safe_title:
+            return f"{safe_title}{ext}"
+    return fallback
+
+
+@dataclass
+class DownloadJob(BaseJob):
+    url: str
+    type: str  # 'video' or 'audio'
+    quality: str
+    title: Optional[str] = None
+    phase: Optional[str] = None  # downloading, processing
+    downloaded_bytes: int = 0
+    total_bytes: Optional[int] = None
+    speed: Optional[float] = None  # bytes/s
+    eta: Optional[float] = None  # seconds
+    output_path: Optional[str] = None
+
+    @property
+    def filename(self) -> Optional[str]:
+        if not self.output_path:
+            return None
+        return download_filename(self.title, os.path.splitext(self.output_path)[1], os.path.basename(self.output_path))
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "url": self.url,
+            "type": self.type,
+            "quality": self.quality,
+            "status": self.status,
+            "phase": self.phase,
+            "progress": self.progress,
+            "downloaded_bytes": self.downloaded_bytes,
+            "total_bytes": self.total_bytes,
+            "speed": self.speed,
+            "eta": self.eta,
+            "filename": self.filename,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def download_options(type: str, quality: str, output_template: str) -> dict:
+    opts = {
+        'outtmpl': output_template,
+        'quiet': True,
+        'no_warnings': True,
+        'noplaylist': True,
+        # Progress goes through the hooks, not the console
+        'noprogress': True,
+        'concurrent_fragment_downloads': FRAGMENT_CONCURRENCY,
+    }
+    if type == 'audio' and quality == 'original':
+        # Audio stream as published (M4A/WebM), no transcoding
+        opts['format'] = 'bestaudio[ext=m4a]/bestaudio'
+    elif type == 'audio':
+        opts.update({
+            'format': 'bestaudio/best',
+            'postprocessors': [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'mp3',
+                'preferredquality': '192',
+            }],
+        })
+    else:
+        # H.264/AAC first for compatibility
+        opts['format'] = VIDEO_FORMATS.get(quality, VIDEO_FORMATS['best'])
+        opts['merge_output_format'] = 'mp4'
+    return opts
+
+
+# Set by the format selection done during extraction; a new selection that
+# picks a single file does not clear them, so they must not be carried over
+SELECTION_KEYS = ('requested_formats', 'requested_downloads')
+
+
+def fresh_info(info: dict) -> dict:
+    """Copy of extracted info, ready for another format selection."""
+    info = copy.deepcopy(info)
+    for key in SELECTION_KEYS:
+        info.pop(key, None)
+    return info
+
+
+def select_format(info: dict, spec: str) -> Optional[dict]:
+    """
+    yt-dlp's format selection applied to already extracted info (no network).
+    Returns the selected info, with `requested_formats` when streams must be
+    merged, or None when nothing matches `spec`.
+    """
+    with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True, 'format': spec}) as ydl:
+        try:
+            return ydl.process_ie_result(fresh_info(info), download=False)
+        except YoutubeDLError:
+            return None
+
+
+_can_merge = None
+
+
+def can_merge() -> bool:
+    """Whether yt-dlp finds ffmpeg to merge separate video and audio streams."""
+    global _can_merge
+    if _can_merge is None:
+        with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
+            _can_merge = FFmpegMergerPP(ydl).available
+    return _can_merge
+
+
+def choose_format(info: dict, type: str, preferred: str) -> str:
+    """Exact format id(s) to download, e.g. "137+140", picked from the known format list."""
+    candidates = [preferred] if type == 'audio' else [preferred, FALLBACK_FORMAT, SINGLE_FILE_FORMAT]
+    for spec in candidates:
+        selected = select_format(info, spec)
+        if selected is None:
+            continue
+        if selected.get('requested_formats') and not can_merge():
+            continue
+        return selected['format_id']
+    raise RuntimeError("No downloadable format for this video")
+
+
+class ProgressRelay:
+    """yt-dlp hooks (called in the download thread) forwarding throttled updates to the loop."""
+
+    def __init__(self, job: DownloadJob, loop: asyncio.AbstractEventLoop):
+        self.job = job
+        self.loop = loop
+        self.last = 0.0
+        # Separate streams (video + audio) are downloaded one after the other
+        self.streams = {}  # filename -> (downloaded, total)
+
+    def _send(self, force=False, **changes):
+        now = time.monotonic()
+        if not force and now - self.last < PROGRESS_INTERVAL:
+            return
+        self.last = now
+        self.loop.call_soon_threadsafe(lambda: self.job.update(**changes))
+
+    def progress_hook(self, d):
+        if d['status'] not in ('downloading', 'finished'):
+            return
+        total = d.get('total_bytes') or d.get('total_bytes_estimate')
+        self.streams[d.get('filename')] = (d.get('downloaded_bytes') or 0, total)
+        downloaded = sum(done for done, _ in self.streams.values())
+        totals = [size for _, size in self.streams.values()]
+        total_bytes = sum(totals) if all(totals) else None
+        changes = {"phase": "downloading", "downloaded_bytes": downloaded, "total_bytes": total_bytes,
+                   "speed": d.get('speed'), "eta": d.get('eta')}
+        if total_bytes:
+            # Never move backwards when the next stream starts
+            changes["progress"] = max(self.job.progress, round(min(downloaded / total_bytes, 1.0), 3))
+        self._send(force=d['status'] == 'finished', **changes)
+
+    def postprocessor_hook(self, d):
+        if d['status'] == 'started':
+            self._send(force=True, phase="processing", speed=None, eta=None)
+
+
+class DownloadManager(JobQueue):
+    full_message = "Download queue is full, try again later"
+
+    def __init__(self, cache: DownloadCache, metadata: MetadataService, max_workers: int = 3, queue_depth: int = 16):
+        super().__init__(queue_depth, cache)
+        self.metadata = metadata
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="yt-download")
+        self._streams = 0  # relays in progress
+
+    @classmethod
+    def from_env(cls, download_dir: str, metadata: MetadataService):
+        return cls(
+            DownloadCache(os.path.join(download_dir, "cache"), int(os.getenv("YOUTUBE_CACHE_MB", "2048")) * 1024 * 1024),
+            metadata,
+            max_workers=int(os.getenv("YOUTUBE_DOWNLOAD_WORKERS", "3")),
+            queue_depth=int(os.getenv("YOUTUBE_QUEUE_DEPTH", "16")),
+        )
+
+    def pending(self) -> int:
+        # A relay uses as much bandwidth as a download
+        return super().pending() + self._streams
+
+    def open_stream(self):
+        """Take a queue slot for a relayed stream; raises QueueFull. Give it back with close_stream()."""
+        self.check_queue()
+        self._streams += 1
+
+    def close_stream(self):
+        self._streams -= 1
+
+    def new_jobs(self, urls, type: str, quality: str) -> int:
+        """
+        Number of downloads submitting these URLs would start: cached files,
+        downloads already in flight and repeats within the list start none.
+        """
+        return self._count_new(self.key_for(url, type, quality) for url in urls)
+
+    def key_for(self, url: str, type: str, quality: str) -> str:
+        return download_key(canonical_url(url), type, download_options(type, quality, "")['format'])
+
+    def submit(self, url: str, type: str, quality: str, title: Optional[str] = None) -> DownloadJob:
+        """
+        Queue a download. Raises QueueFull. A cached file comes back as an
+        already finished job, and a request for a download in progress gets a
+        job following it that keeps this request's title (the download name).
+        Batches call check_queue(new_jobs(...)) first so they are admitted
+        whole or not at all.
+        """
+        self._forget_expired()
+        url = canonical_url(url)
+        key = self.key_for(url, type, quality)
+        if title is None:
+            title = (self.metadata.cached(url) or {}).get('title')
+
+        cached_path = self.cache.get(key)
+        if cached_path:
+            job = DownloadJob(id=str(uuid.uuid4()), url=url, type=type, quality=quality, title=title,
+                              cache_key=key, status="done", progress=1.0, output_path=cached_path,
+                              finished_at=time.time())
+            return self._add(job)
+        if key in self._in_flight:
+            return self._join(key, title=title)
+
+        self.check_queue()
+        job = DownloadJob(id=str(uuid.uuid4()), url=url, type=type, quality=quality, title=title, cache_key=key)
+        self._start(job, self._run(job))
+        return job
+
+    async def _run(self, job: DownloadJob):
+        loop = asyncio.get_running_loop()
+        try:
+            info = await self.metadata.get(job.url)
+            for request in (job, *job.followers):
+                if not request.title:
+                    request.title = info.get('title')
+            try:
+                output_path = await loop.run_in_executor(self._executor, self._download, job, ProgressRelay(job, loop), info)
+            except Exception as e:
+                # Media URLs in cached info can expire; retry once from a fresh extraction
+                print(f"Download from cached info failed: {e}. Retrying with a fresh extraction...")
+                self.metadata.invalidate(job.url)
+                info = await self.metadata.get(job.url)
+                output_path = await loop.run_in_executor(self._executor, self._download, job, ProgressRelay(job, loop), info)
+            job.update(status="done", phase=None, progress=1.0, speed=None, eta=None,
+                       output_path=output_path, finished_at=time.time())
+        except Exception as e:
+            print(f"Download Error: {str(e)}")
+            job.update(status="failed", error=str(e), speed=None, eta=None, finished_at=time.time())
+
+    def _download(self, job: DownloadJob, relay: ProgressRelay, info: dict) -> str:
+        """Blocking: download in this pool thread and return the cached file path."""
+        relay.loop.call_soon_threadsafe(lambda: job.update(status="running"))
+        prefix = self.cache.temp_prefix()
+        try:
+            return self.cache.put(job.cache_key, self._fetch(job, relay, prefix, info))
+        finally:
+            self.cache.discard_temp(prefix)
+
+    def _fetch(self, job: DownloadJob, relay: ProgressRelay, prefix: str, info: dict) -> str:
+        opts = download_options(job.type, job.quality, f"{prefix}.%(ext)s")
+        opts['format'] = choose_format(info, job.type, opts['format'])
+        opts['progress_hooks'] = [relay.progress_hook]
+        opts['postprocessor_hooks'] = [relay.postprocessor_hook]
+        with yt_dlp.YoutubeDL(opts) as ydl:
+            # Same as ydl.download() minus the extraction
+            ydl.process_ie_result(fresh_info(info), download=True)
+
+        directory, name = os.path.split(prefix)
+        for entry in os.listdir(directory):
+            # Skip leftovers of an unfinished or failed attempt
+            if entry.startswith(name + ".") and not entry.endswith((".part", ".ytdl")):
+                return os.path.join(directory, entry)
+        raise RuntimeError("Download failed: File not found on server")
+
+    def stats(self):
+        return {
+            "workers": self.max_workers,
+            "queue_depth": self.queue_depth,
+            "pending": self.pending(),
+            "running": sum(1 for job in self.jobs.values() if job.status == "running"),
+            "streams": self._streams,
+            "cache": self.cache.stats(),
+        }
@@ -0,0 +1,192 @@
+"""
+Video metadata lookups shared by every request.
+
+URLs are normalised to a video ID (youtu.be/X, watch?v=X&t=1, shorts/X, ...
+all map to the same entry), extracted info is kept for a TTL, and concurrent
+lookups of the same video join the single extraction already in flight.
+yt-dlp runs on a small dedicated thread pool, never on the event loop, and
+each thread reuses its own YoutubeDL instance. Playlists are expanded with a
+flat extraction (one request for the list, not one per video).
+"""
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+import yt_dlp
+
+VIDEO_ID = re.compile(r"^[A-Za-z0-9_-]{11}$")
+YOUTUBE_HOSTS = {"youtube.com", "m.youtube.com", "music.youtube.com", "youtube-nocookie.com"}
+# Path prefixes followed by the video ID, e.g. /shorts/<id>
+ID_PATHS = ("shorts", "embed", "live", "v", "e")
+
+YDL_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    # A watch URL with &list= describes the video, not the whole playlist
+    'noplaylist': True,
+}
+
+PLAYLIST_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'extract_flat': 'in_playlist',
+}
+
+
+def video_id(url: str) -> Optional[str]:
+    """The YouTube video ID in `url`, or None for other sites / unrecognised URLs."""
+    url = url.strip()
+    if VIDEO_ID.match(url):
+        return url
+    parsed = urlparse(url if "://" in url else f"https://{url}")
+    host = (parsed.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    parts = [p for p in parsed.path.split("/") if p]
+
+    candidate = None
+    if host == "youtu.be" and parts:
+        candidate = parts[0]
+    elif host in YOUTUBE_HOSTS:
+        if parsed.path == "/watch":
+            candidate = parse_qs(parsed.query).get("v", [None])[0]
+        elif len(parts) >= 2 and parts[0] in ID_PATHS:
+            candidate = parts[1]
+    return candidate if candidate and VIDEO_ID.match(candidate) else None
+
+
+def playlist_id(url: str) -> Optional[str]:
+    """The `list=` parameter of a YouTube URL (playlist page or watch URL), if any."""
+    parsed = urlparse(url.strip() if "://" in url else f"https://{url.strip()}")
+    host = (parsed.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if host not in YOUTUBE_HOSTS and host != "youtu.be":
+        return None
+    return parse_qs(parsed.query).get("list", [None])[0]
+
+
+def canonical_url(url: str) -> str:
+    vid = video_id(url)
+    return f"https://www.youtube.com/watch?v={vid}" if vid else url.strip()
+
+
+class MetadataService:
+    def __init__(self, ttl: float = 600, max_entries: int = 256, workers: int = 4):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._cache = OrderedDict()  # canonical url -> (expires_at, info)
+        self._in_flight = {}  # canonical url -> asyncio.Task
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="yt-info")
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.joined = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            ttl=float(os.getenv("YOUTUBE_INFO_TTL", "600")),
+            max_entries=int(os.getenv("YOUTUBE_INFO_CACHE_SIZE", "256")),
+            workers=int(os.getenv("YOUTUBE_INFO_WORKERS", "4")),
+        )
+
+    def _ydl(self) -> yt_dlp.YoutubeDL:
+        ydl = getattr(self._local, "ydl", None)
+        if ydl is None:
+            ydl = self._local.ydl = yt_dlp.YoutubeDL(YDL_OPTS)
+        return ydl
+
+    def _extract(self, url: str) -> dict:
+        return self._ydl().extract_info(url, download=False)
+
+    def cached(self, url: str) -> Optional[dict]:
+        """Info for `url` if it is cached and fresh."""
+        key = canonical_url(url)
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, info = entry
+        if expires_at < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return info
+
+    def invalidate(self, url: str):
+        self._cache.pop(canonical_url(url), None)
+
+    def _store(self, key: str, info: dict):
+        self._cache[key] = (time.monotonic() + self.ttl, info)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    async def get(self, url: str) -> dict:
+        """Extracted info for `url` (full yt-dlp info dict). Failures are not cached."""
+        key = canonical_url(url)
+        info = self.cached(key)
+        if info is not None:
+            self.hits += 1
+            return info
+
+        task = self._in_flight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.create_task(self._fetch(key))
+            self._in_flight[key] = task
+        else:
+            self.joined += 1
+        # shield: one caller disconnecting must not cancel the others' lookup
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: str) -> dict:
+        loop = asyncio.get_running_loop()
+        try:
+            info = await loop.run_in_executor(self._executor, self._extract, key)
+            self._store(key, info)
+            return info
+        finally:
+            self._in_flight.pop(key, None)
+
+    def _playlist_entries(self, url: str, limit: int):
+        opts = {**PLAYLIST_OPTS, 'playlistend': limit}
+        with yt_dlp.YoutubeDL(opts) as ydl:
+            info = ydl.extract_info(url, download=False)
+        if info.get('_type') != 'playlist':
+            return [(canonical_url(url), info.get('title'))]
+        entries = []
+        for entry in info.get('entries') or []:
+            entry_url = entry.get('url') or entry.get('webpage_url') or entry.get('id')
+            if entry_url:
+                entries.append((canonical_url(entry_url), entry.get('title')))
+        return entries
+
+    async def expand(self, url: str, limit: int = 50):
+        """
+        [(video url, title or None)] for a playlist URL, or just the video
+        itself for anything else (no extraction needed).
+        """
+        list_id = playlist_id(url)
+        if list_id is None:
+            return [(canonical_url(url), None)]
+        playlist_url = f"https://www.youtube.com/playlist?list={list_id}"
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._playlist_entries, playlist_url, limit)
+
+    def stats(self):
+        return {
+            "entries": len(self._cache),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "in_flight": len(self._in_flight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "joined": self.joined,
+        }
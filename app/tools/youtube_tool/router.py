@@ -1,10 +1,19 @@
-from fastapi import APIRouter, Request, Form, HTTPException, BackgroundTasks
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
+from fastapi import APIRouter, Request, Form, HTTPException
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
-import yt_dlp
+from functools import partial
+from typing import Optional
 import os
-import uuid
+import mimetypes
 import asyncio
+from fastapi.concurrency import run_in_threadpool, iterate_in_threadpool
+from ...jobqueue import QueueFull
+from ...responses import JobEventsResponse, ReleasingFileResponse, ReleasingStreamingResponse
+from ...retention import retention
+from ...zipstream import ZipStream
+from .downloads import DownloadManager, download_filename, download_options
+from .stream import select_stream, relay, attachment_header
+from .metadata import MetadataService
 
 router = APIRouter()
 templates = Jinja2Templates(directory=["app/templates", "app/tools/youtube_tool/templates"])
@@ -13,12 +22,15 @@ templates = Jinja2Templates(directory=["app/templates", "app/tools/youtube_tool/
 DOWNLOAD_DIR = "app/static/downloads"
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
-def cleanup_file(path: str):
-    try:
-        if os.path.exists(path):
-            os.remove(path)
-    except Exception:
-        pass
+# Extracted video info, cached and shared between concurrent requests
+metadata_service = MetadataService.from_env()
+# Downloads run as background jobs on a bounded pool; finished files are
+# cached per (video, type, format) under DOWNLOAD_DIR/cache
+download_manager = DownloadManager.from_env(DOWNLOAD_DIR, metadata_service)
+# Cached files count against the "downloads" retention quota and age limit
+retention.attach("downloads", download_manager.cache)
+
+BATCH_MAX_ENTRIES = int(os.getenv("YOUTUBE_BATCH_MAX_ENTRIES", "50"))
 
 @router.get("/tools/youtube", response_class=HTMLResponse)
 async def youtube_page(request: Request):
@@ -27,124 +39,225 @@ async def youtube_page(request: Request):
 @router.post("/tools/youtube/info")
 async def get_video_info(url: str = Form(...)):
     try:
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-        }
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            
-            # Extract relevant info
-            video_info = {
-                "title": info.get('title'),
-                "thumbnail": info.get('thumbnail'),
-                "duration": info.get('duration'),
-                "formats": []
-            }
-            
-            # Simplify formats for the UI
-            # We'll just offer generic quality options in the UI and let yt-dlp pick the best match
-            # But we can return some metadata if needed.
-            # For now, just returning basic info is enough as we'll use format strings for downloading.
-            
-            return JSONResponse(content=video_info)
+        info = await metadata_service.get(url)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+    # The UI offers generic quality options and yt-dlp picks the best match
+    # when downloading, so basic info is enough here.
+    video_info = {
+        "title": info.get('title'),
+        "thumbnail": info.get('thumbnail'),
+        "duration": info.get('duration'),
+        "formats": []
+    }
+    return JSONResponse(content=video_info)
+
+@router.get("/tools/youtube/info/stats")
+async def info_stats():
+    return metadata_service.stats()
+
+def _submit(url: str, type: str, quality: str, title: Optional[str]):
+    try:
+        return download_manager.submit(url, type, quality, title)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+def _send_cached(key: str, title: Optional[str]):
+    """FileResponse for a cached download (None if not cached); it cannot be evicted until sent."""
+    path = download_manager.cache.acquire(key)
+    if path is None:
+        return None
+    filename = download_filename(title, os.path.splitext(path)[1], os.path.basename(path))
+    return ReleasingFileResponse(path, partial(download_manager.cache.release, key), filename=filename,
+                                 media_type="application/octet-stream")
+
+def _send_file(job):
+    response = _send_cached(job.cache_key, job.title)
+    if response is None:
+        raise HTTPException(status_code=410, detail="File is no longer available")
+    return response
+
+def _get_job(job_id: str):
+    job = download_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @router.post("/tools/youtube/download")
 async def download_video(
-    background_tasks: BackgroundTasks,
     url: str = Form(...),
     type: str = Form(...), # 'video' or 'audio'
     quality: str = Form(...), # 'best', '1080p', '720p', 'audio_best'
     title: str = Form(None)
 ):
+    """Download and wait for the file; the download itself runs as a queued job."""
+    job = _submit(url, type, quality, title)
+    await download_manager.result(job)
+    if job.status != "done":
+        raise HTTPException(status_code=500, detail=f"Server Error: {job.error}")
+
+    return _send_file(job)
+
+@router.get("/tools/youtube/stream")
+async def stream_download(
+    url: str,
+    type: str = 'video',
+    quality: str = 'best',
+    title: Optional[str] = None
+):
+    """
+    Download with the shortest time-to-first-byte. Single-stream formats
+    (quality=progressive, or type=audio&quality=original) are relayed to the
+    client while they are fetched; anything that needs a merge or transcoding
+    goes through a regular job and is sent once finished.
+    """
+    key = download_manager.key_for(url, type, quality)
+    title = title or (metadata_service.cached(url) or {}).get('title')
+    cached = _send_cached(key, title)
+    if cached is not None:
+        return cached
+
     try:
-        file_id = str(uuid.uuid4())
-        output_template = os.path.join(DOWNLOAD_DIR, f"{file_id}.%(ext)s")
-        
-        # Base options
-        ydl_opts = {
-            'outtmpl': output_template,
-            'quiet': True,
-            'no_warnings': True,
-        }
-
-        if type == 'audio':
-            ydl_opts.update({
-                'format': 'bestaudio/best',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-            })
-            # Audio download
-            loop = asyncio.get_running_loop()
-            await loop.run_in_executor(None, lambda: _download(ydl_opts, url))
-            
-        else:
-            # Video download with fallback
-            # Try preferred format first (H.264/AAC for compatibility)
-            preferred_format = None
-            if quality == 'best':
-                preferred_format = 'bestvideo[ext=mp4][vcodec^=avc]+bestaudio[ext=m4a]/best[ext=mp4]/best'
-            elif quality == '1080p':
-                preferred_format = 'bestvideo[height<=1080][ext=mp4][vcodec^=avc]+bestaudio[ext=m4a]/best[height<=1080][ext=mp4]/best'
-            elif quality == '720p':
-                preferred_format = 'bestvideo[height<=720][ext=mp4][vcodec^=avc]+bestaudio[ext=m4a]/best[height<=720][ext=mp4]/best'
-            elif quality == '480p':
-                preferred_format = 'bestvideo[height<=480][ext=mp4][vcodec^=avc]+bestaudio[ext=m4a]/best[height<=480][ext=mp4]/best'
-            else:
-                preferred_format = 'bestvideo[ext=mp4][vcodec^=avc]+bestaudio[ext=m4a]/best[ext=mp4]/best'
-            
-            ydl_opts['format'] = preferred_format
-            ydl_opts['merge_output_format'] = 'mp4'
-
-            loop = asyncio.get_running_loop()
-            try:
-                await loop.run_in_executor(None, lambda: _download(ydl_opts, url))
-            except Exception as e:
-                print(f"Preferred format download failed: {e}. Retrying with standard format...")
-                # Fallback to standard best format if preferred fails
-                ydl_opts['format'] = 'bestvideo+bestaudio/best'
-                # We still try to merge to mp4 if possible, but let yt-dlp decide if it needs to
-                # If ffmpeg is missing, this might still fail on merge, but at least we tried.
-                await loop.run_in_executor(None, lambda: _download(ydl_opts, url))
-
-        # Find the downloaded file
-        downloaded_file = None
-        for f in os.listdir(DOWNLOAD_DIR):
-            if f.startswith(file_id):
-                downloaded_file = os.path.join(DOWNLOAD_DIR, f)
-                break
-        
-        if not downloaded_file:
-            raise Exception("Download failed: File not found on server")
-
-        # Determine filename
-        if title:
-            # Sanitize title
-            import re
-            safe_title = re.sub(r'[\\/*?:"<>|]', "", title)
-            safe_title = safe_title.strip()
-            ext = os.path.splitext(downloaded_file)[1]
-            filename = f"{safe_title}{ext}"
-        else:
-            filename = os.path.basename(downloaded_file)
-        
-        background_tasks.add_task(cleanup_file, downloaded_file)
-
-        return FileResponse(
-            downloaded_file, 
-            filename=filename, 
-            media_type="application/octet-stream"
-        )
+        info = await metadata_service.get(url)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    title = title or info.get('title')
+
+    fmt = await run_in_threadpool(select_stream, info, download_options(type, quality, ""))
+    if fmt is not None:
+        try:
+            # A relay holds a queue slot, like a download, until its response ends
+            download_manager.open_stream()
+        except QueueFull as e:
+            raise HTTPException(status_code=429, detail=str(e))
+        response = None
+        try:
+            response = await _relay_response(fmt, key, title)
+        finally:
+            if response is None:
+                download_manager.close_stream()
+        if response is not None:
+            return response
+
+    job = _submit(url, type, quality, title)
+    await download_manager.result(job)
+    if job.status != "done":
+        raise HTTPException(status_code=500, detail=f"Server Error: {job.error}")
+    return _send_file(job)
 
+async def _relay_response(fmt: dict, key: str, title: Optional[str]):
+    """Response relaying `fmt` (it gives the queue slot back when done), or None to fall back to a job."""
+    chunks = relay(fmt, download_manager.cache, key)
+    try:
+        # Fetch the first bytes before committing to a 200 so upstream errors can still fall back
+        first = await chunks.__anext__()
     except Exception as e:
-        print(f"Download Error: {str(e)}") # Log to console
-        raise HTTPException(status_code=500, detail=f"Server Error: {str(e)}")
+        print(f"Streaming failed: {e}. Falling back to a regular download...")
+        await chunks.aclose()
+        return None
+
+    async def body():
+        yield first
+        async for chunk in chunks:
+            yield chunk
+
+    filename = download_filename(title, f".{fmt['ext']}", f"{fmt.get('id')}.{fmt['ext']}")
+    headers = {"Content-Disposition": attachment_header(filename)}
+    if fmt.get('filesize'):
+        headers["Content-Length"] = str(fmt['filesize'])
+    media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    return ReleasingStreamingResponse(body(), download_manager.close_stream, media_type=media_type, headers=headers)
+
+@router.post("/tools/youtube/batch")
+async def download_batch(
+    urls: str = Form(...), # video and/or playlist links, whitespace separated
+    type: str = Form('video'),
+    quality: str = Form('best')
+):
+    """
+    Download several videos, or whole playlists, as one zip. Entries run as
+    regular jobs on the download pool (cached files are reused) and the zip
+    streams back as they finish; failures are listed in errors.txt.
+    """
+    entries = {}
+    for url in urls.split():
+        try:
+            expanded = await metadata_service.expand(url, limit=BATCH_MAX_ENTRIES)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"{url}: {e}")
+        for entry_url, title in expanded:
+            entries.setdefault(entry_url, title)
+    if not entries:
+        raise HTTPException(status_code=400, detail="No videos to download")
+    if len(entries) > BATCH_MAX_ENTRIES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_ENTRIES} videos per batch")
+
+    # Only videos that are not cached or already downloading take a queue slot
+    new_jobs = download_manager.new_jobs(entries, type, quality)
+    if new_jobs > download_manager.queue_depth:
+        # Would never fit, however long the client waits
+        raise HTTPException(status_code=413, detail=f"At most {download_manager.queue_depth} new downloads per batch")
+    try:
+        # The whole batch must fit; each submit below then passes the regular check
+        download_manager.check_queue(new_jobs)
+        jobs = [download_manager.submit(url, type, quality, title) for url, title in entries.items()]
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    async def zip_stream():
+        archive = ZipStream()
+        errors = []
+        for next_done in asyncio.as_completed([download_manager.result(job) for job in jobs]):
+            job = await next_done
+            path = download_manager.cache.acquire(job.cache_key) if job.status == "done" else None
+            if path is None:
+                errors.append(f"{job.url}: {job.error or 'File is no longer available'}")
+                continue
+            try:
+                async for chunk in iterate_in_threadpool(archive.iter_file(path, job.filename)):
+                    if chunk:
+                        yield chunk
+            finally:
+                download_manager.cache.release(job.cache_key)
+        if errors:
+            yield archive.add_bytes("errors.txt", "\n".join(errors).encode())
+        yield archive.close()
+
+    return StreamingResponse(
+        zip_stream(),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="youtube_downloads.zip"'},
+    )
+
+@router.post("/tools/youtube/jobs", status_code=202)
+async def create_job(
+    url: str = Form(...),
+    type: str = Form(...),
+    quality: str = Form(...),
+    title: str = Form(None)
+):
+    job = _submit(url, type, quality, title)
+    return JSONResponse(status_code=202, content=job.to_dict())
+
+@router.get("/tools/youtube/jobs")
+async def download_stats():
+    return download_manager.stats()
+
+@router.get("/tools/youtube/jobs/{job_id}")
+async def job_status(job_id: str):
+    return _get_job(job_id).to_dict()
+
+@router.get("/tools/youtube/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-Sent Events stream of progress updates until the job finishes."""
+    return JobEventsResponse(_get_job(job_id), download_manager)
 
-def _download(opts, url):
-    with yt_dlp.YoutubeDL(opts) as ydl:
-        ydl.download([url])
+@router.get("/tools/youtube/jobs/{job_id}/file")
+async def job_file(job_id: str):
+    job = _get_job(job_id)
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    return _send_file(job)
@@ -0,0 +1,116 @@
+"""
+Pipe-through streaming for downloads that need no merge or transcoding.
+
+When the requested format resolves to a single progressive HTTP(S) stream
+(e.g. `best[ext=mp4]`, or `bestaudio` kept as-is), the media URL picked by
+yt-dlp is fetched with ranged requests and relayed to the client as the
+bytes arrive, instead of waiting for the whole download to land on disk.
+The bytes are also written to a pending file that goes into the
+DownloadCache once the transfer is complete and its size checks out.
+"""
+import asyncio
+import os
+from typing import Optional
+from urllib.parse import quote
+
+import httpx
+
+from .cache import DownloadCache
+from .downloads import select_format
+
+# Protocols yt-dlp downloads with a plain HTTP GET
+DIRECT_PROTOCOLS = {"http", "https"}
+
+# Range size when the format gives none; large single requests get throttled
+DEFAULT_CHUNK_SIZE = 10 * 1024 * 1024
+
+READ_SIZE = 64 * 1024
+
+
+def select_stream(info: dict, opts: dict) -> Optional[dict]:
+    """
+    Run yt-dlp's format selection on already extracted info. Returns the
+    chosen format if it can be streamed as-is, None when a merge, a
+    post-processor or a non-HTTP protocol (HLS, DASH) is involved.
+    Blocking; run it in a thread.
+    """
+    if opts.get('postprocessors'):
+        return None
+    selected = select_format(info, opts['format'])
+    if selected is None or selected.get('requested_formats') or selected.get('protocol') not in DIRECT_PROTOCOLS:
+        return None
+    if not selected.get('url'):
+        return None
+    return selected
+
+
+async def relay(fmt: dict, cache: DownloadCache, key: str):
+    """
+    Yield the media bytes of `fmt`; the copy is committed to the cache under
+    `key` only when it provably holds every byte (size known and matched).
+    An aborted or unverifiable transfer (client gone, upstream error, no
+    size) leaves nothing behind.
+    """
+    chunk_size = (fmt.get('downloader_options') or {}).get('http_chunk_size') or DEFAULT_CHUNK_SIZE
+    headers = dict(fmt.get('http_headers') or {})
+    prefix = cache.temp_prefix()
+    temp_path = f"{prefix}.{fmt.get('ext') or 'bin'}"
+    start, total = 0, fmt.get('filesize')
+    finished = False
+    sink = await asyncio.to_thread(open, temp_path, "wb")
+    try:
+        async with httpx.AsyncClient(follow_redirects=True, timeout=30) as client:
+            while total is None or start < total:
+                end = start + chunk_size - 1
+                if total is not None:
+                    end = min(end, total - 1)
+                async with client.stream("GET", fmt['url'], headers={**headers, "Range": f"bytes={start}-{end}"}) as resp:
+                    if resp.status_code == 416 and total is None and start > 0:
+                        # Size was never announced; we just read past the end
+                        break
+                    resp.raise_for_status()
+                    if start > 0 and resp.status_code != 206:
+                        # A full body here would be appended after the bytes already sent
+                        raise RuntimeError(f"Range request for bytes {start}- answered with {resp.status_code}")
+                    # The server's own figure wins over the size yt-dlp reported
+                    total = _total_from(resp) or total
+                    received = 0
+                    async for block in resp.aiter_bytes(READ_SIZE):
+                        received += len(block)
+                        await asyncio.to_thread(sink.write, block)
+                        yield block
+                start += received
+                if resp.status_code != 206 or received == 0:
+                    # Whole body in one response, or nothing left to read
+                    break
+        finished = True
+    finally:
+        complete = finished and total is not None and start == total
+        await asyncio.to_thread(_finish, sink, cache, key, prefix, temp_path, total if complete else None)
+
+
+def _finish(sink, cache: DownloadCache, key: str, prefix: str, temp_path: str, total: Optional[int]):
+    """Blocking: close the pending file, cache it if it has exactly `total` bytes, drop leftovers."""
+    sink.close()
+    if total is not None and os.path.getsize(temp_path) == total:
+        cache.put(key, temp_path)
+    cache.discard_temp(prefix)
+
+
+def _total_from(resp: httpx.Response) -> Optional[int]:
+    """Full size from `Content-Range: bytes 0-99/1234`, if the server sent it."""
+    value = resp.headers.get("content-range", "")
+    size = value.rpartition("/")[2]
+    if size.isdigit():
+        return int(size)
+    if resp.status_code == 200 and resp.headers.get("content-length", "").isdigit():
+        return int(resp.headers["content-length"])
+    return None
+
+
+def attachment_header(filename: str) -> str:
+    """Content-Disposition value, RFC 5987-encoded for non-ASCII names (as FileResponse does)."""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
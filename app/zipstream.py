@@ -0,0 +1,66 @@
+"""
+Zip archives produced incrementally, for streaming responses.
+
+zipfile writes to any object with a write() method; without seek()/tell()
+it switches to data descriptors, so entries can be emitted one after the
+other without knowing the final archive layout. Everything is stored
+uncompressed: the payloads (images, media) are already compressed.
+"""
+import zipfile
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class _Buffer:
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+class ZipStream:
+    def __init__(self):
+        self._buffer = _Buffer()
+        self._zip = zipfile.ZipFile(self._buffer, "w", compression=zipfile.ZIP_STORED, allowZip64=True)
+        self._names = set()
+
+    def unique_name(self, name: str) -> str:
+        """Avoid duplicate entries: photo.png, photo (1).png, ..."""
+        base, dot, ext = name.rpartition(".")
+        if not dot:
+            base, ext = name, ""
+        candidate, n = name, 1
+        while candidate in self._names:
+            candidate = f"{base} ({n}).{ext}" if dot else f"{base} ({n})"
+            n += 1
+        self._names.add(candidate)
+        return candidate
+
+    def iter_file(self, path: str, arcname: str):
+        """Add a file from disk, yielding archive bytes as it is copied (blocking I/O)."""
+        info = zipfile.ZipInfo.from_file(path, self.unique_name(arcname))
+        info.compress_type = zipfile.ZIP_STORED
+        with open(path, "rb") as src, self._zip.open(info, "w") as dest:
+            while block := src.read(CHUNK_SIZE):
+                dest.write(block)
+                yield self._buffer.drain()
+        yield self._buffer.drain()
+
+    def add_bytes(self, arcname: str, data: bytes) -> bytes:
+        self._zip.writestr(self.unique_name(arcname), data)
+        return self._buffer.drain()
+
+    def close(self) -> bytes:
+        """Write the central directory and return the final bytes."""
+        self._zip.close()
+        return self._buffer.drain()
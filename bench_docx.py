@@ -0,0 +1,97 @@
+"""
+DOCX -> PDF benchmark: latency and peak memory of the renderer.
+
+"before" is the original pipeline (mammoth inlining images as base64, a new
+WeasyPrint font configuration per document). "after" is
+app.tools.converter_tool.docx (warm renderer, images extracted to files).
+Each mode runs in its own process converting every sample `runs` times, like
+a long-lived converter worker; peak memory is that process's max RSS.
+
+Usage: python bench_docx.py [runs] [file.docx ...]
+Without files, the sample DOCX files in app/static/uploads are used.
+"""
+import glob
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def convert_before(input_path, output_path):
+    import mammoth
+    from weasyprint import HTML
+    with open(input_path, "rb") as docx_file:
+        result = mammoth.convert_to_html(docx_file)
+        html = result.value
+        HTML(string=html).write_pdf(output_path)
+
+
+def convert_after(input_path, output_path):
+    from app.tools.converter_tool.docx import convert_docx_to_pdf
+    convert_docx_to_pdf(input_path, output_path)
+
+
+def worker(mode: str, runs: int, files):
+    """Runs in a child process; prints per-file timings and peak RSS as JSON."""
+    convert = convert_before if mode == "before" else convert_after
+    timings = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = os.path.join(tmp, "out.pdf")
+        for path in files:
+            samples = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                convert(path, output_path)
+                samples.append(time.perf_counter() - start)
+            timings[path] = samples
+    # ru_maxrss is in kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    print(json.dumps({"timings": timings, "peak_rss": peak}))
+
+
+def run_mode(mode: str, runs: int, files):
+    out = subprocess.run(
+        [sys.executable, __file__, "--worker", mode, str(runs), *files],
+        check=True,
+        stdout=subprocess.PIPE,
+        text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    if sys.argv[1:2] == ["--worker"]:
+        worker(sys.argv[2], int(sys.argv[3]), sys.argv[4:])
+        return
+
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    files = sys.argv[2:] or sorted(glob.glob("app/static/uploads/*.docx"))
+    if not files:
+        sys.exit("No DOCX files to convert")
+
+    results = {mode: run_mode(mode, runs, files) for mode in ("before", "after")}
+
+    for path in files:
+        print(os.path.basename(path))
+        for mode in ("before", "after"):
+            samples = results[mode]["timings"][path]
+            print(f"  {mode:7} first {samples[0] * 1000:8.1f} ms   "
+                  f"median {statistics.median(samples) * 1000:8.1f} ms")
+
+    for mode in ("before", "after"):
+        samples = [t for timings in results[mode]["timings"].values() for t in timings]
+        print(f"{mode:7} overall median {statistics.median(samples) * 1000:8.1f} ms   "
+              f"peak RSS {results[mode]['peak_rss'] / 1024 / 1024:8.1f} MB")
+
+    before = [t for timings in results["before"]["timings"].values() for t in timings]
+    after = [t for timings in results["after"]["timings"].values() for t in timings]
+    print(f"DOCX -> PDF: {statistics.median(before) / statistics.median(after):.1f}x faster, "
+          f"{results['before']['peak_rss'] / results['after']['peak_rss']:.1f}x less peak memory")
+
+
+if __name__ == "__main__":
+    main()
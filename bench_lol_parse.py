@@ -0,0 +1,201 @@
+"""
+LeagueOfGraphs parsing benchmark: BeautifulSoup/html.parser vs the lxml
+single-pass parser.
+
+"before" is the original extraction (html.parser, a backwards header search
+per item row and a whole-document scan per section). "after" is
+app.tools.lol_tool.parser.parse_build. Both use the same Data Dragon data,
+so their output is compared as well as timed.
+
+Usage: python bench_lol_parse.py [runs] [page.html ...]
+Saved pages are named after the champion slug (ahri.html). Without pages,
+synthetic LoG-shaped pages of increasing size are generated; their filler
+stands in for the navigation, ads and stat tables of the real site.
+"""
+import os
+import statistics
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from app.tools.lol_tool.ddragon import StaticData
+from app.tools.lol_tool.parser import format_champion_name_for_ddragon, parse_build
+
+
+def parse_before(champion_name, html, static):
+    soup = BeautifulSoup(html, 'html.parser')
+    ddragon_ver = static.version
+    data = {
+        "name": champion_name,
+        "icon": f"https://ddragon.leagueoflegends.com/cdn/img/champion/tiles/{champion_name.capitalize()}_0.jpg",
+        "items": {"starting": [], "core": [], "final": [], "boots": []},
+        "runes": {"primary": [], "secondary": []},
+        "skills": [],
+        "matchups": {"good": [], "bad": []},
+    }
+
+    for row in soup.select('div.iconsRow'):
+        header = row.find_previous(['h2', 'h3', 'h4'])
+        if not header:
+            continue
+        text = header.get_text().strip().lower()
+        category = None
+        if "starting" in text:
+            category = "starting"
+        elif "core" in text:
+            category = "core"
+        elif "end game" in text or "final" in text:
+            category = "final"
+        elif "boots" in text:
+            category = "boots"
+        if not category:
+            continue
+        imgs = row.select('img.requireTooltip')
+        seen_in_cat = set()
+        if category == "core" and len(imgs) >= 4:
+            tooltip_var = imgs[0].get('tooltip-var', '')
+            alt_text = imgs[0].get('alt', '')
+            if 'item-' in tooltip_var and alt_text:
+                item_id = tooltip_var.replace('item-', '')
+                data["items"].setdefault("early", []).append({
+                    "name": alt_text,
+                    "icon": f"https://ddragon.leagueoflegends.com/cdn/{ddragon_ver}/img/item/{item_id}.png",
+                })
+            imgs = imgs[1:]
+        for img in imgs:
+            tooltip_var = img.get('tooltip-var', '')
+            alt_text = img.get('alt', '')
+            if 'item-' in tooltip_var and alt_text and alt_text not in seen_in_cat:
+                seen_in_cat.add(alt_text)
+                item_id = tooltip_var.replace('item-', '')
+                data["items"][category].append({
+                    "name": alt_text,
+                    "icon": f"https://ddragon.leagueoflegends.com/cdn/{ddragon_ver}/img/item/{item_id}.png",
+                })
+                if category in ["starting", "core", "final"] and len(data["items"][category]) >= 3:
+                    break
+                if category == "boots" and len(data["items"][category]) >= 1:
+                    break
+
+    selected_runes = []
+    for perks_table in soup.select('.perksTableOverview'):
+        for img in perks_table.select('img.requireTooltip'):
+            style = img.parent.get('style', '')
+            opacity = 1.0
+            if 'opacity' in style:
+                try:
+                    opacity = float(style.split('opacity:')[1].split(';')[0].strip())
+                except (IndexError, ValueError):
+                    pass
+            if opacity > 0.5:
+                rune_id = None
+                for cls in img.get('class', []):
+                    if cls.startswith('perk-'):
+                        parts = cls.split('-')
+                        if len(parts) >= 2:
+                            rune_id = parts[1]
+                            break
+                selected_runes.append({"name": img.get('alt', 'Unknown'), "icon": static.rune_icon(rune_id), "id": rune_id})
+    if len(selected_runes) >= 4:
+        data["runes"]["primary"] = selected_runes[:4]
+    if len(selected_runes) >= 6:
+        data["runes"]["secondary"] = selected_runes[4:6]
+    if len(selected_runes) >= 9:
+        data["runes"]["stats"] = selected_runes[6:9]
+
+    skill_header = soup.find(lambda tag: tag.name in ['h2', 'h3', 'h4'] and "Skill Order" in tag.get_text())
+    if skill_header:
+        container = skill_header.find_next('div')
+        if container:
+            keys = [s.get_text().strip() for s in container.select('.championSpell')]
+            spell_map = dict(zip(['Q', 'W', 'E', 'R'], static.spells.get(static.champion_key(champion_name), [])))
+            data["skills"] = [
+                {"key": k, "icon": static.spell_icon(spell_map[k]) if k in spell_map else ""}
+                for k in keys if k in ['Q', 'W', 'E', 'R']
+            ][:4]
+
+    def extract_matchups(header_text):
+        header = soup.find(lambda tag: tag.name in ['h2', 'h3', 'h4'] and header_text in tag.get_text())
+        champs = []
+        if header:
+            container = header.find_next('div')
+            if container:
+                for img in container.find_all('img'):
+                    alt = img.get('alt')
+                    if alt:
+                        champion = static.index.resolve(alt.strip())
+                        name = champion.key if champion else format_champion_name_for_ddragon(alt.strip())
+                        champs.append({'name': alt.strip(), 'icon': f"https://ddragon.leagueoflegends.com/cdn/{ddragon_ver}/img/champion/{name}.png"})
+                    if len(champs) >= 5:
+                        break
+        return champs
+
+    data["matchups"]["good"] = extract_matchups("Counters")
+    data["matchups"]["bad"] = extract_matchups("Is countered by")
+    return data
+
+
+def synthetic_page(filler: int) -> bytes:
+    """A LoG-shaped build page with `filler` blocks of unrelated markup around the sections."""
+    def noise(n):
+        return "".join(
+            f'<div class="box"><h4>Stat {i}</h4><table><tr><td><a href="/x/{i}">row {i}</a></td>'
+            f'<td><span class="pct">{i % 100}%</span><img src="/img/{i}.png" alt=""></td></tr></table></div>'
+            for i in range(n)
+        )
+
+    def item(i, name):
+        return f'<img class="requireTooltip" tooltip-var="item-{i}" alt="{name}" src="/i/{i}.png">'
+
+    def rune(rid, name, selected):
+        return f'<div style="opacity: {1 if selected else 0.2};"><img class="requireTooltip perk-{rid}-48" alt="{name}"></div>'
+
+    quarter = filler // 4
+    sections = [
+        noise(quarter),
+        '<h3>Starting Items</h3><div class="iconsRow">' + item(1056, "Doran's Ring") + item(2003, "Health Potion") + '</div>',
+        '<h3>Core Items</h3><div class="iconsRow">' + "".join(item(i, f"Item {i}") for i in (3802, 6655, 3020, 4645)) + '</div>',
+        noise(quarter),
+        '<h3>End Game Items</h3><div class="iconsRow">' + "".join(item(i, f"Item {i}") for i in (3089, 3157, 3135, 3165)) + '</div>',
+        '<h3>Boots</h3><div class="iconsRow">' + item(3020, "Sorcerer's Shoes") + '</div>',
+        '<div class="perksTableOverview">' + "".join(rune(r, f"Rune {r}", r in (8112, 8126, 8138, 8105, 8226, 8210)) for r in (8112, 8124, 8126, 8139, 8138, 8135, 8105, 8226, 8210, 8234)) + '</div>',
+        '<div class="perksTableOverview">' + "".join(rune(r, f"Shard {r}", True) for r in (5008, 5008, 5001)) + '</div>',
+        noise(quarter),
+        '<h3>Skill Order</h3><div>' + "".join(f'<div class="championSpell">{k}</div>' for k in "QEWQQRQ") + '</div>',
+        '<h3>Counters</h3><div>' + "".join(f'<a><img alt="{n}"></a>' for n in ("Kog'Maw", "Wukong", "Lux", "Zed", "Fizz", "Annie")) + '</div>',
+        '<h3>Is countered by</h3><div>' + "".join(f'<a><img alt="{n}"></a>' for n in ("Kassadin", "Galio", "Yasuo", "Nunu & Willump", "Vex", "Ekko")) + '</div>',
+        noise(quarter),
+    ]
+    return ("<!DOCTYPE html><html><head><title>Ahri Build</title></head><body>" + "".join(sections) + "</body></html>").encode()
+
+
+def measure(parse, champion_name, html, static, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = parse(champion_name, html, static)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+
+def main():
+    args = sys.argv[1:]
+    runs = int(args.pop(0)) if args and args[0].isdigit() else 5
+    static = StaticData(snapshot_path=os.getenv("LOL_DDRAGON_SNAPSHOT", "app/static/lol/ddragon.json"))
+
+    if args:
+        pages = [(os.path.splitext(os.path.basename(path))[0], path, open(path, "rb").read()) for path in args]
+    else:
+        pages = [("ahri", f"synthetic x{n}", synthetic_page(n)) for n in (200, 1000, 4000)]
+
+    print(f"{'page':<28}{'size':>10}{'before':>12}{'after':>12}{'speedup':>10}  same output")
+    for champion_name, label, html in pages:
+        before, expected = measure(parse_before, champion_name, html, static, runs)
+        after, result = measure(parse_build, champion_name, html, static, runs)
+        print(f"{label:<28}{len(html) // 1024:>8}KB{before * 1000:>10.1f}ms{after * 1000:>10.1f}ms"
+              f"{before / after:>9.1f}x  {'yes' if result == expected else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
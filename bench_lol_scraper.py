@@ -0,0 +1,130 @@
+"""
+Offline benchmark and regression suite for the LoL scraper.
+
+Replays fixtures recorded with `lol_fixtures.py record` through the local
+stand-in server and reports, per champion:
+
+  parse   median parse_build time on the saved page
+  peak    peak Python memory allocated while parsing (tracemalloc; lxml's
+          own C tree is not traced)
+  cold    end-to-end scrape with a new client and empty Data Dragon state
+          (page, versions, runes, champion list and spells)
+  warm    median end-to-end scrape once Data Dragon data is cached (the page only)
+
+Each result is compared with expected/<slug>.json from the recording; the
+exit status is non-zero if any differ. --update rewrites the expectations.
+
+Usage: python bench_lol_scraper.py [--dir fixtures/lol] [--runs 5] [--latency 0.0] [--update] [champion ...]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+from lol_fixtures import DEFAULT_DIR, LOG_HOST, start_server
+
+
+def recorded_champions(root: str):
+    pages = os.path.join(root, LOG_HOST, "champions", "builds")
+    return sorted(os.listdir(pages)) if os.path.isdir(pages) else []
+
+
+def measure_parse(parse_build, slug, html, static, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        parse_build(slug, html, static)
+        samples.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        parse_build(slug, html, static)
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+    return statistics.median(samples), peak
+
+
+async def bench_champion(scraper, StaticData, parse_build, root, slug, runs):
+    # Cold: nothing cached and no pooled connection yet
+    scraper.ddragon = StaticData(snapshot_path=None)
+    async with scraper.make_client() as client:
+        start = time.perf_counter()
+        result = await scraper.scrape_champion_async(client, slug)
+        cold = time.perf_counter() - start
+
+        warm_samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = await scraper.scrape_champion_async(client, slug)
+            warm_samples.append(time.perf_counter() - start)
+
+    with open(os.path.join(root, LOG_HOST, "champions", "builds", slug), "rb") as f:
+        html = f.read()
+    parse, peak = measure_parse(parse_build, slug, html, scraper.ddragon, runs)
+    return result, {"parse": parse, "peak": peak, "cold": cold, "warm": statistics.median(warm_samples)}
+
+
+def check_expected(root, slug, result, update):
+    """'ok', 'DIFF', 'new' (written with --update) or 'none' (nothing recorded)."""
+    path = os.path.join(root, "expected", f"{slug}.json")
+    if update and result is not None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+        return "new"
+    if not os.path.exists(path):
+        return "none"
+    with open(path) as f:
+        return "ok" if json.load(f) == result else "DIFF"
+
+
+async def run(args, champions):
+    from app.tools.lol_tool import scraper
+    from app.tools.lol_tool.ddragon import StaticData
+    from app.tools.lol_tool.parser import parse_build
+
+    print(f"{'champion':<16}{'parse':>10}{'peak':>10}{'cold':>10}{'warm':>10}  expected")
+    failures = 0
+    for slug in champions:
+        result, m = await bench_champion(scraper, StaticData, parse_build, args.dir, slug, args.runs)
+        status = check_expected(args.dir, slug, result, args.update)
+        failures += status == "DIFF" or result is None
+        print(f"{slug:<16}{m['parse'] * 1000:>8.1f}ms{m['peak'] // 1024:>8}KB"
+              f"{m['cold'] * 1000:>8.1f}ms{m['warm'] * 1000:>8.1f}ms  {status if result is not None else 'SCRAPE FAILED'}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("champions", nargs="*", help="slugs to run (default: every recorded page)")
+    parser.add_argument("--dir", default=DEFAULT_DIR)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the stand-in adds to every response")
+    parser.add_argument("--update", action="store_true", help="rewrite expected/<slug>.json from this run")
+    args = parser.parse_args()
+
+    champions = args.champions or recorded_champions(args.dir)
+    if not champions:
+        sys.exit(f"No recorded pages in {args.dir}; run `python lol_fixtures.py record <champion> ...` first")
+
+    server, env = start_server(args.dir, latency=args.latency)
+    # Must be set before the scraper modules read them at import
+    os.environ.update(env)
+    for name in ("app.tools.lol_tool", "httpx"):
+        logging.getLogger(name).setLevel(logging.ERROR)
+    try:
+        failures = asyncio.run(run(args, champions))
+    finally:
+        server.shutdown()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
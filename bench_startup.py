@@ -0,0 +1,68 @@
+"""
+Startup benchmark: time from launching uvicorn to the first successful response.
+
+Compares eager tool loading (LAZY_TOOLS=0, every tool router imported at startup)
+with lazy loading (LAZY_TOOLS=1, tools imported on first hit).
+
+Usage: python bench_startup.py [runs] [path]
+"""
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_first_request(lazy: bool, path: str, timeout: float = 120.0):
+    port = free_port()
+    env = dict(os.environ, LAZY_TOOLS="1" if lazy else "0", WARM_TOOLS="0")
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError("uvicorn exited before serving a request")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=timeout) as resp:
+                    resp.read()
+                    return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        raise TimeoutError("server did not answer in time")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    path = sys.argv[2] if len(sys.argv) > 2 else "/"
+
+    results = {}
+    for label, lazy in (("eager (before)", False), ("lazy (after)", True)):
+        samples = [time_to_first_request(lazy, path) for _ in range(runs)]
+        results[label] = samples
+        print(f"{label:16} median {statistics.median(samples) * 1000:8.1f} ms   "
+              f"min {min(samples) * 1000:8.1f} ms   max {max(samples) * 1000:8.1f} ms")
+
+    before = statistics.median(results["eager (before)"])
+    after = statistics.median(results["lazy (after)"])
+    print(f"Time-to-first-request for {path}: {before / after:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Record/replay fixtures for the LoL scraper.
+
+record: scrapes the given champions from the live sites and saves every
+successful upstream response (LeagueOfGraphs pages, Data Dragon JSON) under
+the fixture directory as <host>/<path>. It also saves the parsed result of
+each champion to expected/<slug>.json for bench_lol_scraper.py to compare
+against.
+
+serve: a local stand-in for both hosts that replays those files (anything
+not recorded is a 404), optionally with added latency. Point the app or the
+old scripts (reproduce_issue.py, test_scraper_final.py) at it with the
+environment variables it prints.
+
+Usage:
+  python lol_fixtures.py record ahri yasuo "kog'maw" ... [--dir fixtures/lol]
+  python lol_fixtures.py serve [--dir fixtures/lol] [--port 8765] [--latency 0.05]
+"""
+import argparse
+import asyncio
+import http.server
+import json
+import mimetypes
+import os
+import threading
+import time
+
+import httpx
+
+DEFAULT_DIR = "fixtures/lol"
+LOG_HOST = "www.leagueofgraphs.com"
+DDRAGON_HOST = "ddragon.leagueoflegends.com"
+
+# Headers describing the wire format, not the (already decoded) body
+HOP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+def fixture_path(root: str, host: str, path: str) -> str:
+    """File for a recorded URL; None if `path` tries to leave the fixture directory."""
+    base = os.path.realpath(os.path.join(root, host))
+    full = os.path.realpath(os.path.join(base, path.split("?")[0].lstrip("/")))
+    if full != base and not full.startswith(base + os.sep):
+        return None
+    return full
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Passes requests through and writes every 200 response body to the fixture directory."""
+
+    def __init__(self, root: str, wrapped: httpx.AsyncBaseTransport = None):
+        self.root = root
+        self.wrapped = wrapped or httpx.AsyncHTTPTransport()
+        self.recorded = []
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self.wrapped.handle_async_request(request)
+        body = await response.aread()
+        await response.aclose()
+        if response.status_code == 200:
+            path = fixture_path(self.root, request.url.host, request.url.path)
+            if path:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(body)
+                self.recorded.append(path)
+        headers = [(k, v) for k, v in response.headers.items() if k.lower() not in HOP_HEADERS]
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+
+    async def aclose(self):
+        await self.wrapped.aclose()
+
+
+async def record(champions, root: str):
+    from app.tools.lol_tool import scraper
+    from app.tools.lol_tool.ddragon import StaticData
+
+    # Fresh Data Dragon state so versions, runes and champion lists are recorded too
+    scraper.ddragon = StaticData(snapshot_path=None)
+    transport = RecordingTransport(root)
+    os.makedirs(os.path.join(root, "expected"), exist_ok=True)
+    async with scraper.make_client(transport=transport) as client:
+        await scraper.ddragon.refresh(client)
+        for name in champions:
+            data = await scraper.scrape_champion_async(client, name)
+            slug = scraper.ddragon.champion_slug(name)
+            if data is None:
+                print(f"{name}: scrape failed, nothing expected recorded")
+                continue
+            with open(os.path.join(root, "expected", f"{slug}.json"), "w") as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+            print(f"{name}: recorded as {slug}")
+    print(f"{len(transport.recorded)} responses saved under {root}")
+
+
+def make_handler(root: str, latency: float):
+    class ReplayHandler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real hosts
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+            host, _, path = self.path.lstrip("/").partition("/")
+            file_path = fixture_path(root, host, path) if host else None
+            if not file_path or not os.path.isfile(file_path):
+                self._send(404, b"not recorded", "text/plain")
+                return
+            with open(file_path, "rb") as f:
+                body = f.read()
+            content_type = mimetypes.guess_type(file_path)[0] or "text/html; charset=utf-8"
+            self._send(200, body, content_type)
+
+        def _send(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return ReplayHandler
+
+
+def start_server(root: str, port: int = 0, latency: float = 0.0):
+    """Replay server on a background thread. Returns (server, env vars pointing the scraper at it)."""
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), make_handler(root, latency))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    env = {
+        "LOL_LOG_BASE": f"{base}/{LOG_HOST}",
+        "LOL_DDRAGON_BASE": f"{base}/{DDRAGON_HOST}",
+        # Keep replay runs away from the real snapshot
+        "LOL_DDRAGON_SNAPSHOT": "",
+        "LOL_PREFETCH": "0",
+    }
+    return server, env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    rec = commands.add_parser("record")
+    rec.add_argument("champions", nargs="+")
+    rec.add_argument("--dir", default=DEFAULT_DIR)
+    srv = commands.add_parser("serve")
+    srv.add_argument("--dir", default=DEFAULT_DIR)
+    srv.add_argument("--port", type=int, default=8765)
+    srv.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        asyncio.run(record(args.champions, args.dir))
+        return
+
+    server, env = start_server(args.dir, args.port, args.latency)
+    print(f"Replaying {args.dir} on http://127.0.0.1:{server.server_port}")
+    for name, value in env.items():
+        print(f"export {name}={value!r}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()